@@ -53,7 +53,8 @@ async def get_categories(
     existing_cols = {c['name'] for c in inspector.get_columns('categories')}
     has_featured_cols = 'featured_image_id' in existing_cols and 'featured_image_position' in existing_cols
 
-    # Always get categories with image counts in a single efficient query
+    # Always get categories with image counts in a single efficient query; the
+    # association table alone is enough to count, so images is never joined
     if has_featured_cols:
         query = db.query(
             Category.id,
@@ -63,8 +64,8 @@ async def get_categories(
             Category.created_at,
             Category.featured_image_id,
             Category.featured_image_position,
-            func.count(Image.id).label('image_count')
-        ).outerjoin(Category.images).group_by(
+            func.count(image_categories.c.image_id).label('image_count')
+        ).outerjoin(image_categories, image_categories.c.category_id == Category.id).group_by(
             Category.id,
             Category.name,
             Category.description,
@@ -80,8 +81,8 @@ async def get_categories(
             Category.description,
             Category.color,
             Category.created_at,
-            func.count(Image.id).label('image_count')
-        ).outerjoin(Category.images).group_by(
+            func.count(image_categories.c.image_id).label('image_count')
+        ).outerjoin(image_categories, image_categories.c.category_id == Category.id).group_by(
             Category.id,
             Category.name,
             Category.description,
@@ -93,7 +94,7 @@ async def get_categories(
         query = query.filter(Category.name.ilike(f"%{search}%"))
     
     if sort_by == "count":
-        query = query.order_by(func.count(Image.id).desc())
+        query = query.order_by(func.count(image_categories.c.image_id).desc())
     else:
         query = query.order_by(Category.name)
     
@@ -103,8 +104,9 @@ async def get_categories(
     featured_ids = list({getattr(r, 'featured_image_id', None) for r in results if has_featured_cols and getattr(r, 'featured_image_id', None)})
     thumb_map: Dict[int, str] = {}
     if featured_ids:
-        images = db.query(Image).filter(Image.id.in_(featured_ids)).all()
-        thumb_map = {img.id: img.thumbnail_path for img in images}
+        thumb_map = dict(
+            db.query(Image.id, Image.thumbnail_path).filter(Image.id.in_(featured_ids)).all()
+        )
     
     # Convert results to CategoryResponse format
     categories = []
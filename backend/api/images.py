@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, UploadFile, File
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session, joinedload, defer
-from sqlalchemy import or_, and_, desc, asc, func
+from sqlalchemy.orm import Session, joinedload, selectinload, defer
+from sqlalchemy import or_, and_, desc, asc, func, delete, insert, tuple_
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 import os
@@ -10,19 +10,32 @@ import tempfile
 from datetime import datetime
 import os
 import shutil
+from itertools import combinations
 
 from backend.models import get_db, Image, Tag, Category, SessionLocal, engine, DuplicateIgnore
-from backend.models.image import image_categories
+from backend.models.image import image_categories, image_tags
 from backend.services.enhanced_thumbnail_generator import EnhancedThumbnailGenerator
 from backend.services.thumbnail_generator import ThumbnailGenerator
-from backend.services.phash import phash_from_path, hamming_distance_hex, prefix
+from backend.services.phash import phash_from_path, phash_to_int, hamming_distance, prefix
+from backend.api.tags import invalidate_tag_list_cache
 from backend.services.blacklist import (
     resolve_original_path,
     add_blacklist_entry,
+    add_blacklist_entries,
 )
 
 router = APIRouter()
 
+
+def _remove_if_under(path: str, abs_root: str) -> bool:
+    """Remove `path` only when it resolves inside `abs_root` (an absolute directory)."""
+    abs_path = os.path.abspath(path)
+    if abs_path == abs_root or abs_path.startswith(abs_root.rstrip(os.sep) + os.sep):
+        os.remove(abs_path)
+        return True
+    return False
+
+
 class ImageResponse(BaseModel):
     id: int
     path: str
@@ -70,7 +83,9 @@ class ImageFilter(BaseModel):
 @router.get("/random", response_model=ImageResponse)
 async def get_random_image(db: Session = Depends(get_db)):
     """Return a random image from the library"""
-    image = db.query(Image).order_by(func.random()).limit(1).first()
+    image = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).order_by(func.random()).limit(1).first()
     if not image:
         raise HTTPException(status_code=404, detail="No images available")
     return ImageResponse(**image.to_dict())
@@ -90,7 +105,9 @@ async def delete_image(
     - Removes local media copy when present.
     - Originals on NAS are never deleted (delete_original is ignored).
     """
-    image = db.query(Image).filter(Image.id == image_id).first()
+    image = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id == image_id).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
 
@@ -117,12 +134,8 @@ async def delete_image(
     try:
         if image.local_path and os.path.exists(image.local_path):
             # Safety: ensure we only delete inside MEDIA_DIR
-            try:
-                if os.path.commonpath([os.path.abspath(image.local_path), os.path.abspath(MEDIA_DIR)]) == os.path.abspath(MEDIA_DIR):
-                    os.remove(image.local_path)
-                    result["deleted_local_copy"] = True
-            except Exception:
-                pass
+            if _remove_if_under(image.local_path, os.path.abspath(MEDIA_DIR)):
+                result["deleted_local_copy"] = True
     except Exception:
         pass
 
@@ -138,7 +151,7 @@ async def delete_image(
 
     # Clear relationships to avoid orphan links, then delete record
     try:
-        image.tags = []
+        image.tags = set()
         image.categories = []
         db.delete(image)
         db.commit()
@@ -325,7 +338,7 @@ async def get_images(
                 "thumbnail_paths": enh.get_thumbnail_paths(im.id),
                 "animated_preview_paths": enh.get_animated_preview_paths(im.id),
                 "is_animated": is_anim,
-                "tags": image_tags_map.get(im.id, []),
+                "tags": sorted(image_tags_map.get(im.id, [])),
                 "categories": image_categories_map.get(im.id, []),
             }
             results.append(ImageResponse(**payload))
@@ -639,9 +652,11 @@ async def get_memories(
     m = month or today.month
     d = day or today.day
 
+    # selectinload: one IN query per collection. Joined-loading two collections
+    # across up to 500 rows would multiply rows (tags x categories per image).
     q = db.query(Image).options(
-        joinedload(Image.tags),
-        joinedload(Image.categories).defer(Category.featured_image_id).defer(Category.featured_image_position)
+        selectinload(Image.tags),
+        selectinload(Image.categories).defer(Category.featured_image_id).defer(Category.featured_image_position)
     ).filter(Image.date_taken.isnot(None))
 
     dialect = db.bind.dialect.name if db.bind else 'sqlite'
@@ -750,12 +765,18 @@ async def get_duplicates(
         return []
     rows = db.query(Image.id, Image.filename, Image.phash).filter(Image.phash.isnot(None)).limit(limit).all()
     # Load ignored pairs
-    ignores = db.query(DuplicateIgnore).all()
-    ignored_pairs = {(min(x.image_id_a, x.image_id_b), max(x.image_id_a, x.image_id_b)) for x in ignores}
+    ignores = db.query(DuplicateIgnore.image_id_a, DuplicateIgnore.image_id_b).all()
+    ignored_pairs = {(min(a, b), max(a, b)) for a, b in ignores}
+    # Hex hashes are parsed to ints once per row, not once per compared pair
     by_bucket = {}
+    hash_ints = {}
     for r in rows:
         if not r.phash:
             continue
+        h = phash_to_int(r.phash)
+        if h is None:
+            continue
+        hash_ints[r.id] = h
         p = prefix(r.phash, prefix_bits)
         by_bucket.setdefault(p, []).append(r)
 
@@ -773,7 +794,7 @@ async def get_duplicates(
                 b = items[j]
                 if b.id in visited:
                     continue
-                dist = hamming_distance_hex(a.phash, b.phash)
+                dist = hamming_distance(hash_ints[a.id], hash_ints[b.id])
                 if dist <= threshold and (min(a.id, b.id), max(a.id, b.id)) not in ignored_pairs:
                     cluster_ids.append(b.id)
                     dists.append(dist)
@@ -786,7 +807,9 @@ async def get_duplicates(
     result = []
     for c in clusters:
         ids = c['image_ids']
-        imgs = db.query(Image).filter(Image.id.in_(ids)).all()
+        imgs = db.query(Image).options(
+            selectinload(Image.tags), selectinload(Image.categories)
+        ).filter(Image.id.in_(ids)).all()
         # Ensure images are ordered to match ids so distances align
         img_by_id = {im.id: im for im in imgs}
         ordered_imgs = [img_by_id[i] for i in ids if i in img_by_id]
@@ -841,20 +864,21 @@ async def add_image_tags(
     db: Session = Depends(get_db)
 ):
     """Add tags to an image"""
-    image = db.query(Image).filter(Image.id == image_id).first()
+    image = db.query(Image).options(selectinload(Image.tags)).filter(Image.id == image_id).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    for tag_name in tag_names:
+    needed_tags = set()
+    for tag_name in dict.fromkeys(tag_names):
         tag = db.query(Tag).filter(Tag.name == tag_name).first()
         if not tag:
             tag = Tag(name=tag_name)
             db.add(tag)
-        
-        if tag not in image.tags:
-            image.tags.append(tag)
-    
+        needed_tags.add(tag)
+
+    image.tags.update(needed_tags)
     db.commit()
+    invalidate_tag_list_cache()
     return {"message": f"Added {len(tag_names)} tags to image"}
 
 @router.delete("/{image_id}/tags")
@@ -864,18 +888,21 @@ async def remove_image_tags(
     db: Session = Depends(get_db)
 ):
     """Remove tags from an image"""
-    image = db.query(Image).filter(Image.id == image_id).first()
+    image = db.query(Image).options(selectinload(Image.tags)).filter(Image.id == image_id).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    removed_count = 0
+    tags_to_remove = set()
     for tag_name in tag_names:
         tag = db.query(Tag).filter(Tag.name == tag_name).first()
-        if tag and tag in image.tags:
-            image.tags.remove(tag)
-            removed_count += 1
-    
+        if tag:
+            tags_to_remove.add(tag)
+
+    tags_to_remove &= image.tags
+    removed_count = len(tags_to_remove)
+    image.tags.difference_update(tags_to_remove)
     db.commit()
+    invalidate_tag_list_cache()
     return {"message": f"Removed {removed_count} tags from image"}
 
 @router.post("/download")
@@ -944,19 +971,25 @@ async def get_search_suggestions(
 class IgnorePairsRequest(BaseModel):
     pairs: List[List[int]]  # [[a,b], ...]
 
+def _normalized_pairs(pairs: List[List[int]]) -> List[tuple]:
+    """Order each pair as (min, max) and drop repeats, keeping request order"""
+    return list(dict.fromkeys((min(a, b), max(a, b)) for a, b in pairs))
+
 @router.post("/duplicates/ignore")
 async def ignore_duplicate_pairs(body: IgnorePairsRequest, db: Session = Depends(get_db)):
-    added = 0
-    for a, b in body.pairs:
-        a1, b1 = (a, b) if a <= b else (b, a)
-        exists = db.query(DuplicateIgnore).filter(
-            DuplicateIgnore.image_id_a == a1, DuplicateIgnore.image_id_b == b1
-        ).first()
-        if not exists:
-            db.add(DuplicateIgnore(image_id_a=a1, image_id_b=b1))
-            added += 1
+    pairs = _normalized_pairs(body.pairs)
+    if not pairs:
+        return {"message": "Ignored 0 pairs"}
+    # One row-value IN lookup served by the (image_id_a, image_id_b) unique index
+    pair_key = tuple_(DuplicateIgnore.image_id_a, DuplicateIgnore.image_id_b)
+    existing = set(db.query(DuplicateIgnore.image_id_a, DuplicateIgnore.image_id_b).filter(
+        pair_key.in_(pairs)
+    ).all())
+    new_pairs = [p for p in pairs if p not in existing]
+    if new_pairs:
+        db.execute(insert(DuplicateIgnore), [{"image_id_a": a, "image_id_b": b} for a, b in new_pairs])
     db.commit()
-    return {"message": f"Ignored {added} pairs"}
+    return {"message": f"Ignored {len(new_pairs)} pairs"}
 
 @router.get("/duplicates/ignore")
 async def list_ignored_pairs(db: Session = Depends(get_db)):
@@ -965,13 +998,11 @@ async def list_ignored_pairs(db: Session = Depends(get_db)):
 
 @router.delete("/duplicates/ignore")
 async def unignore_duplicate_pairs(body: IgnorePairsRequest, db: Session = Depends(get_db)):
+    pairs = _normalized_pairs(body.pairs)
     removed = 0
-    for a, b in body.pairs:
-        a1, b1 = (a, b) if a <= b else (b, a)
-        q = db.query(DuplicateIgnore).filter(
-            DuplicateIgnore.image_id_a == a1, DuplicateIgnore.image_id_b == b1
-        )
-        removed += q.delete()
+    if pairs:
+        pair_key = tuple_(DuplicateIgnore.image_id_a, DuplicateIgnore.image_id_b)
+        removed = db.query(DuplicateIgnore).filter(pair_key.in_(pairs)).delete(synchronize_session=False)
     db.commit()
     return {"message": f"Removed {removed} ignored pairs"}
 
@@ -979,21 +1010,17 @@ class MergeDuplicatesRequest(BaseModel):
     keeper_id: int
     duplicate_ids: List[int]
 
-@router.post("/merge-duplicates")
-async def merge_duplicates(body: MergeDuplicatesRequest, db: Session = Depends(get_db)):
-    keeper = db.query(Image).filter(Image.id == body.keeper_id).first()
-    if not keeper:
-        raise HTTPException(status_code=404, detail="Keeper image not found")
-    dups = db.query(Image).filter(Image.id.in_(body.duplicate_ids)).all()
-    if not dups:
-        return {"message": "No duplicates to merge"}
+def _merge_metadata_into_keeper(keeper: Image, dups: List[Image]) -> None:
+    """Merge tags/categories/favorite/rating/date_taken from duplicates into keeper.
+    Membership is tracked by id sets so each check is O(1) instead of a list scan.
+    """
+    existing_cat_ids = {c.id for c in keeper.categories}
     for dup in dups:
-        for t in dup.tags:
-            if t not in keeper.tags:
-                keeper.tags.append(t)
+        keeper.tags.update(dup.tags)
         for c in dup.categories:
-            if c not in keeper.categories:
+            if c.id not in existing_cat_ids:
                 keeper.categories.append(c)
+                existing_cat_ids.add(c.id)
         if getattr(dup, 'favorite', False):
             keeper.favorite = True
         try:
@@ -1003,6 +1030,20 @@ async def merge_duplicates(body: MergeDuplicatesRequest, db: Session = Depends(g
             pass
         if getattr(dup, 'date_taken', None) and not getattr(keeper, 'date_taken', None):
             keeper.date_taken = dup.date_taken
+
+@router.post("/merge-duplicates")
+async def merge_duplicates(body: MergeDuplicatesRequest, db: Session = Depends(get_db)):
+    keeper = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id == body.keeper_id).first()
+    if not keeper:
+        raise HTTPException(status_code=404, detail="Keeper image not found")
+    dups = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id.in_(body.duplicate_ids)).all()
+    if not dups:
+        return {"message": "No duplicates to merge"}
+    _merge_metadata_into_keeper(keeper, dups)
     db.commit()
     return {"message": f"Merged metadata from {len(dups)} images into {keeper.id}"}
 
@@ -1018,35 +1059,25 @@ async def merge_and_delete_duplicates(body: MergeDeleteRequest, db: Session = De
     - Deletes duplicates' DB rows and thumbnail files; deletes local media copies; originals are never deleted.
     Returns a summary of actions.
     """
-    keeper = db.query(Image).filter(Image.id == body.keeper_id).first()
+    keeper = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id == body.keeper_id).first()
     if not keeper:
         raise HTTPException(status_code=404, detail="Keeper image not found")
-    dups = db.query(Image).filter(Image.id.in_(body.duplicate_ids)).all()
+    dups = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id.in_(body.duplicate_ids)).all()
     if not dups:
         return {"message": "No duplicates provided", "deleted": 0}
 
     # Merge metadata (reuse logic from merge_duplicates)
-    for dup in dups:
-        for t in dup.tags:
-            if t not in keeper.tags:
-                keeper.tags.append(t)
-        for c in dup.categories:
-            if c not in keeper.categories:
-                keeper.categories.append(c)
-        if getattr(dup, 'favorite', False):
-            keeper.favorite = True
-        try:
-            if getattr(dup, 'rating', 0) and (keeper.rating or 0) < dup.rating:
-                keeper.rating = dup.rating
-        except Exception:
-            pass
-        if getattr(dup, 'date_taken', None) and not getattr(keeper, 'date_taken', None):
-            keeper.date_taken = dup.date_taken
+    _merge_metadata_into_keeper(keeper, dups)
 
     # Delete duplicates (files + DB rows); never delete originals
     THUMBNAILS_DIR = os.getenv("THUMBNAILS_DIR", "/thumbnails")
     MEDIA_DIR = os.getenv("MEDIA_DIR", "/data/media")
-    deleted = 0
+    abs_media = os.path.abspath(MEDIA_DIR)
+    dup_ids: List[int] = []
     failed: List[int] = []
 
     for dup in dups:
@@ -1062,30 +1093,34 @@ async def merge_and_delete_duplicates(body: MergeDeleteRequest, db: Session = De
             # Remove local media copy if under MEDIA_DIR
             try:
                 if getattr(dup, 'local_path', None) and os.path.exists(dup.local_path):
-                    try:
-                        if os.path.commonpath([os.path.abspath(dup.local_path), os.path.abspath(MEDIA_DIR)]) == os.path.abspath(MEDIA_DIR):
-                            os.remove(dup.local_path)
-                    except Exception:
-                        pass
+                    _remove_if_under(dup.local_path, abs_media)
             except Exception:
                 pass
 
             # Do not delete original files
-
-            # Clear relationships and delete DB record
-            try:
-                add_blacklist_entry(db, dup, f"duplicate of {keeper.id}")
-            except Exception:
-                # Best-effort; continue with deletion even if blacklist insert fails
-                pass
-            dup.tags = []
-            dup.categories = []
-            db.delete(dup)
-            deleted += 1
+            dup_ids.append(dup.id)
         except Exception:
             failed.append(dup.id)
 
+    # Blacklist the duplicates being deleted in one INSERT to prevent re-importing
+    # them. It commits with the deletes, so a duplicate that stays in the library
+    # is never blacklisted.
+    deleted_ids = set(dup_ids)
     try:
+        add_blacklist_entries(
+            db, [dup for dup in dups if dup.id in deleted_ids], lambda dup: f"duplicate of {keeper.id}"
+        )
+    except Exception:
+        # Best-effort; continue with deletion even if blacklist insert fails
+        pass
+
+    # Clear relationships and delete DB records in bulk: three statements instead of 3N
+    try:
+        deleted = 0
+        if dup_ids:
+            db.execute(delete(image_tags).where(image_tags.c.image_id.in_(dup_ids)))
+            db.execute(delete(image_categories).where(image_categories.c.image_id.in_(dup_ids)))
+            deleted = db.query(Image).filter(Image.id.in_(dup_ids)).delete(synchronize_session=False)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -1101,29 +1136,19 @@ class MergeDeletePairRequest(BaseModel):
 @router.post("/duplicates/merge-delete-pair")
 async def merge_and_delete_pair(body: MergeDeletePairRequest, db: Session = Depends(get_db)):
     """Merge metadata from one duplicate into keeper and delete the duplicate. Originals are never deleted."""
-    keeper = db.query(Image).filter(Image.id == body.keeper_id).first()
+    keeper = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id == body.keeper_id).first()
     if not keeper:
         raise HTTPException(status_code=404, detail="Keeper image not found")
-    dup = db.query(Image).filter(Image.id == body.duplicate_id).first()
+    dup = db.query(Image).options(
+        selectinload(Image.tags), selectinload(Image.categories)
+    ).filter(Image.id == body.duplicate_id).first()
     if not dup:
         return {"message": "Duplicate not found", "deleted": 0}
 
     # Merge metadata
-    for t in dup.tags:
-        if t not in keeper.tags:
-            keeper.tags.append(t)
-    for c in dup.categories:
-        if c not in keeper.categories:
-            keeper.categories.append(c)
-    if getattr(dup, 'favorite', False):
-        keeper.favorite = True
-    try:
-        if getattr(dup, 'rating', 0) and (keeper.rating or 0) < dup.rating:
-            keeper.rating = dup.rating
-    except Exception:
-        pass
-    if getattr(dup, 'date_taken', None) and not getattr(keeper, 'date_taken', None):
-        keeper.date_taken = dup.date_taken
+    _merge_metadata_into_keeper(keeper, [dup])
 
     # Delete files (thumbnail + local copy) and DB row
     THUMBNAILS_DIR = os.getenv("THUMBNAILS_DIR", "/thumbnails")
@@ -1139,11 +1164,7 @@ async def merge_and_delete_pair(body: MergeDeletePairRequest, db: Session = Depe
         # Local media copy (only under MEDIA_DIR)
         try:
             if getattr(dup, 'local_path', None) and os.path.exists(dup.local_path):
-                try:
-                    if os.path.commonpath([os.path.abspath(dup.local_path), os.path.abspath(MEDIA_DIR)]) == os.path.abspath(MEDIA_DIR):
-                        os.remove(dup.local_path)
-                except Exception:
-                    pass
+                _remove_if_under(dup.local_path, os.path.abspath(MEDIA_DIR))
         except Exception:
             pass
         # Never delete original files
@@ -1154,7 +1175,7 @@ async def merge_and_delete_pair(body: MergeDeletePairRequest, db: Session = Depe
         except Exception:
             pass
 
-        dup.tags = []
+        dup.tags = set()
         dup.categories = []
         db.delete(dup)
         db.commit()
@@ -1167,20 +1188,27 @@ async def merge_and_delete_pair(body: MergeDeletePairRequest, db: Session = Depe
 class IgnoreClusterRequest(BaseModel):
     image_ids: List[int]
 
+# Pairwise ignores grow quadratically; 500 ids is already ~125k pairs
+MAX_IGNORE_CLUSTER_SIZE = 500
+
 @router.post("/duplicates/ignore-cluster")
 async def ignore_duplicate_cluster(body: IgnoreClusterRequest, db: Session = Depends(get_db)):
     """Ignore all pairwise combinations within a set of image_ids."""
     ids = sorted(set(body.image_ids))
-    pairs = []
-    for i in range(len(ids)):
-        for j in range(i + 1, len(ids)):
-            a, b = ids[i], ids[j]
-            a1, b1 = (a, b) if a <= b else (b, a)
-            exists = db.query(DuplicateIgnore).filter(
-                DuplicateIgnore.image_id_a == a1, DuplicateIgnore.image_id_b == b1
-            ).first()
-            if not exists:
-                db.add(DuplicateIgnore(image_id_a=a1, image_id_b=b1))
-                pairs.append((a1, b1))
+    if len(ids) > MAX_IGNORE_CLUSTER_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cluster too large to ignore pairwise (max {MAX_IGNORE_CLUSTER_SIZE} images)"
+        )
+    # Load already-ignored pairs within the cluster in one query
+    existing = {
+        (a, b) for a, b in db.query(DuplicateIgnore.image_id_a, DuplicateIgnore.image_id_b).filter(
+            DuplicateIgnore.image_id_a.in_(ids), DuplicateIgnore.image_id_b.in_(ids)
+        )
+    }
+    # ids are sorted, so combinations() yields pairs already normalized as (min, max)
+    pairs = [p for p in combinations(ids, 2) if p not in existing]
+    if pairs:
+        db.execute(insert(DuplicateIgnore), [{"image_id_a": a, "image_id_b": b} for a, b in pairs])
     db.commit()
     return {"message": f"Ignored {len(pairs)} pairs", "count": len(pairs)}
@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import func, select, update
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from backend.models import get_db, Job, SessionLocal
 from backend.models import Image
-from backend.services.metadata_extractor import MetadataExtractor
+from backend.utils.http_cache import make_etag, not_modified
+from backend.workers.celery_app import enqueue
+from backend.workers import jobs as job_tasks
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class JobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     type: str
     status: str
@@ -24,6 +31,76 @@ class JobResponse(BaseModel):
     started_at: Optional[str]
     completed_at: Optional[str]
 
+# Scalar columns backing JobResponse; Job has no relationships, so listings can
+# read plain rows instead of materializing ORM objects.
+_JOB_COLUMNS = (
+    Job.id,
+    Job.type,
+    Job.status,
+    Job.progress,
+    Job.total_items,
+    Job.processed_items,
+    Job.parameters,
+    Job.result,
+    Job.error_message,
+    Job.created_at,
+    Job.started_at,
+    Job.completed_at,
+)
+
+_JOB_DATETIME_FIELDS = ('created_at', 'started_at', 'completed_at')
+
+def _job_row_to_dict(row) -> dict:
+    """Build the JSON-ready body for a row selected with _JOB_COLUMNS"""
+    data = dict(row._mapping)
+    for field in _JOB_DATETIME_FIELDS:
+        value = data[field]
+        data[field] = value.isoformat() if value else None
+    return data
+
+# Thumbnail file count, reused while the directory mtime is unchanged
+_thumb_count_cache = {"count": None, "mtime": None}
+
+def _invalidate_thumb_count():
+    _thumb_count_cache["count"] = None
+
+def _count_thumbnails(thumbnails_dir: str) -> int:
+    """Count thumbnail JPEGs, rescanning only when the directory has changed"""
+    mtime = os.stat(thumbnails_dir).st_mtime_ns
+    if _thumb_count_cache["count"] is not None and _thumb_count_cache["mtime"] == mtime:
+        return _thumb_count_cache["count"]
+    with os.scandir(thumbnails_dir) as entries:
+        count = sum(
+            1 for e in entries
+            if e.name.lower().endswith('.jpg') and e.is_file(follow_symlinks=False)
+        )
+    _thumb_count_cache["count"] = count
+    _thumb_count_cache["mtime"] = mtime
+    return count
+
+def _job_status(db: Session, job_id: int) -> Optional[str]:
+    """Return a job's status, or None if it does not exist"""
+    return db.query(Job.status).filter(Job.id == job_id).scalar()
+
+# Concurrent unlink calls when purging thumbnails
+PURGE_THUMBNAIL_WORKERS = 16
+
+def _try_unlink(path: str) -> int:
+    """Remove a file, returning 1 on success and 0 on failure"""
+    try:
+        os.unlink(path)
+        return 1
+    except Exception:
+        # ignore individual removal errors
+        return 0
+
+def _active_job_id(db: Session, job_type: str) -> Optional[int]:
+    """Return the id of a pending/running job of this type without loading the row"""
+    return db.query(Job.id).filter(
+        Job.type == job_type,
+        Job.status.in_(["pending", "running"])
+    ).limit(1).scalar()
+
 class JobCreate(BaseModel):
     type: str
     parameters: Optional[dict] = None
@@ -39,47 +116,67 @@ class RefreshExifRequest(BaseModel):
     only_missing: bool = False
 
 @router.get("/", response_model=List[JobResponse])
-async def get_jobs(
+def get_jobs(
+    request: Request,
+    response: Response,
     job_type: Optional[str] = None,
     status: Optional[str] = None,
     limit: int = 50,
     db: Session = Depends(get_db)
 ):
-    """Get jobs with optional filtering"""
-    query = db.query(Job)
-    
+    """Get jobs with optional filtering.
+    Answers 304 when the filtered job set is unchanged since the client's ETag.
+    """
+    filters = []
     if job_type:
-        query = query.filter(Job.type == job_type)
-    
+        filters.append(Job.type == job_type)
     if status:
-        query = query.filter(Job.status == status)
-    
-    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
-    return [JobResponse(**job.to_dict()) for job in jobs]
+        filters.append(Job.status == status)
+
+    # Cheap aggregate fingerprint of the filtered jobs; avoids loading rows on a hit
+    signature = db.query(
+        func.count(Job.id),
+        func.max(Job.id),
+        func.max(Job.updated_at),
+        func.sum(Job.processed_items),
+    ).filter(*filters).one()
+    cached = not_modified(request, response, make_etag(limit, *signature))
+    if cached:
+        return cached
+
+    rows = db.execute(
+        select(*_JOB_COLUMNS).where(*filters).order_by(Job.created_at.desc()).limit(limit)
+    ).all()
+    # Rows are already JSON-ready dicts in JobResponse shape; returning the response
+    # directly skips response_model validation and serialization of every item
+    return ORJSONResponse([_job_row_to_dict(row) for row in rows], headers=dict(response.headers))
 
 @router.get("/{job_id}", response_model=JobResponse)
-async def get_job(job_id: int, db: Session = Depends(get_db)):
+def get_job(job_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     """Get a specific job by ID"""
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
+    row = db.execute(select(*_JOB_COLUMNS).where(Job.id == job_id)).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Job not found")
+
+    # Progress polls usually see an unchanged row; the ETag covers every column
+    # in the body, so a match skips building and serializing the response
+    cached = not_modified(request, response, make_etag(*row))
+    if cached:
+        return cached
     
-    return JobResponse(**job.to_dict())
+    # Same JobResponse-shaped dict as get_jobs, returned directly with the ETag header
+    return ORJSONResponse(_job_row_to_dict(row), headers=dict(response.headers))
 
 @router.post("/indexing")
-async def start_indexing_job(
+def start_indexing_job(
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Start a library indexing job"""
     # Check if there's already a running indexing job
-    existing_job = db.query(Job).filter(
-        Job.type == "indexing",
-        Job.status.in_(["pending", "running"])
-    ).first()
-    
-    if existing_job:
-        return {"message": "Indexing job already running", "job_id": existing_job.id}
+    existing_job_id = _active_job_id(db, "indexing")
+    if existing_job_id:
+        return {"message": "Indexing job already running", "job_id": existing_job_id}
     
     # Create new job
     job = Job(type="indexing", parameters={})
@@ -87,36 +184,22 @@ async def start_indexing_job(
     db.commit()
     db.refresh(job)
     
-    # Start background task
-    from backend.services.image_scanner import ImageScanner
-    scanner = ImageScanner()
-
-    def _run_indexing(job_id: int):
-        session = SessionLocal()
-        try:
-            scanner.scan_library(session, job_id)
-        finally:
-            session.close()
-
-    background_tasks.add_task(_run_indexing, job.id)
+    # Hand off to the worker queue (in-process when no broker is configured)
+    enqueue(background_tasks, "indexing.run", job_tasks.run_indexing, job.id)
     
     return {"message": "Indexing job started", "job_id": job.id}
 
 @router.post("/thumbnails")
-async def start_thumbnail_job(
+def start_thumbnail_job(
     background_tasks: BackgroundTasks,
     body: ThumbnailJobRequest,
     db: Session = Depends(get_db)
 ):
     """Start a thumbnail generation job"""
     # Check if there's already a running thumbnail job
-    existing_job = db.query(Job).filter(
-        Job.type == "thumbnailing",
-        Job.status.in_(["pending", "running"])
-    ).first()
-    
-    if existing_job:
-        return {"message": "Thumbnail job already running", "job_id": existing_job.id}
+    existing_job_id = _active_job_id(db, "thumbnailing")
+    if existing_job_id:
+        return {"message": "Thumbnail job already running", "job_id": existing_job_id}
     
     # Create new job
     job = Job(type="thumbnailing", parameters={"force_regenerate": body.force_regenerate, "size": body.size})
@@ -124,23 +207,13 @@ async def start_thumbnail_job(
     db.commit()
     db.refresh(job)
     
-    # Start background task
-    from backend.services.thumbnail_generator import ThumbnailGenerator
-    generator = ThumbnailGenerator(thumbnail_size=body.size)
-
-    def _run_thumbnails(job_id: int, force_regen: bool):
-        session = SessionLocal()
-        try:
-            generator.generate_thumbnails(session, job_id, force_regen)
-        finally:
-            session.close()
-
-    background_tasks.add_task(_run_thumbnails, job.id, body.force_regenerate)
+    # Hand off to the worker queue (in-process when no broker is configured)
+    enqueue(background_tasks, "thumbnails.run", job_tasks.run_thumbnails, job.id, body.force_regenerate, body.size)
     
     return {"message": "Thumbnail job started", "job_id": job.id}
 
 @router.post("/purge-thumbnails")
-async def purge_thumbnails(db: Session = Depends(get_db)):
+def purge_thumbnails(db: Session = Depends(get_db)):
     """Delete all generated thumbnails from the thumbnails directory.
     Does not modify database records.
     """
@@ -151,49 +224,51 @@ async def purge_thumbnails(db: Session = Depends(get_db)):
     if not os.path.exists(THUMBNAILS_DIR):
         return {"message": "No thumbnails directory found", "deleted": 0}
 
-    deleted = 0
-    for name in os.listdir(THUMBNAILS_DIR):
-        path = os.path.join(THUMBNAILS_DIR, name)
-        try:
-            if os.path.isfile(path) and name.lower().endswith('.jpg'):
-                os.remove(path)
-                deleted += 1
-        except Exception:
-            # ignore individual removal errors
-            pass
+    with os.scandir(THUMBNAILS_DIR) as entries:
+        paths = [
+            e.path for e in entries
+            if e.name.lower().endswith('.jpg') and e.is_file(follow_symlinks=False)
+        ]
+    # unlink is I/O bound and releases the GIL; overlapping calls helps on NAS/NFS storage
+    with ThreadPoolExecutor(max_workers=PURGE_THUMBNAIL_WORKERS) as ex:
+        deleted = sum(ex.map(_try_unlink, paths))
+    _invalidate_thumb_count()
 
     return {"message": f"Deleted {deleted} thumbnail files", "deleted": deleted}
 
 @router.get("/thumbnails/status")
-async def thumbnails_status(db: Session = Depends(get_db)):
+def thumbnails_status(request: Request, response: Response, db: Session = Depends(get_db)):
     """Return counts of existing thumbnail files vs total images."""
     THUMBNAILS_DIR = os.getenv("THUMBNAILS_DIR", "/thumbnails")
     # Count images in DB
     total_images = db.query(Image).count()
+    try:
+        dir_mtime = os.stat(THUMBNAILS_DIR).st_mtime_ns
+    except Exception:
+        dir_mtime = None
+    cached = not_modified(request, response, make_etag(dir_mtime, total_images))
+    if cached:
+        return cached
     # Count thumbnail jpg files
     existing = 0
     try:
-        existing = len([f for f in os.listdir(THUMBNAILS_DIR) if f.lower().endswith('.jpg')])
+        existing = _count_thumbnails(THUMBNAILS_DIR)
     except Exception:
         existing = 0
     missing = max(0, total_images - existing)
     return {"total_images": total_images, "thumbnails": existing, "missing": missing}
 
 @router.post("/tagging")
-async def start_tagging_job(
+def start_tagging_job(
     background_tasks: BackgroundTasks,
     body: TaggingJobRequest,
     db: Session = Depends(get_db)
 ):
     """Start an auto-tagging job"""
     # Check if there's already a running tagging job
-    existing_job = db.query(Job).filter(
-        Job.type == "tagging",
-        Job.status.in_(["pending", "running"])
-    ).first()
-    
-    if existing_job:
-        return {"message": "Tagging job already running", "job_id": existing_job.id}
+    existing_job_id = _active_job_id(db, "tagging")
+    if existing_job_id:
+        return {"message": "Tagging job already running", "job_id": existing_job_id}
     
     # Create new job
     job = Job(
@@ -211,132 +286,71 @@ async def start_tagging_job(
     return {"message": "Tagging job started", "job_id": job.id}
 
 @router.post("/refresh-exif")
-async def start_refresh_exif_job(
+def start_refresh_exif_job(
     body: RefreshExifRequest,
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     """Start a job to refresh EXIF/metadata for images (all or only missing)."""
-    existing_job = db.query(Job).filter(
-        Job.type == "refresh-exif",
-        Job.status.in_(["pending", "running"])
-    ).first()
-    if existing_job:
-        return {"message": "Refresh EXIF job already running", "job_id": existing_job.id}
+    existing_job_id = _active_job_id(db, "refresh-exif")
+    if existing_job_id:
+        return {"message": "Refresh EXIF job already running", "job_id": existing_job_id}
 
     job = Job(type="refresh-exif", parameters={"only_missing": body.only_missing})
     db.add(job)
     db.commit()
     db.refresh(job)
 
-    def _run(job_id: int, only_missing: bool):
-        session = SessionLocal()
-        try:
-            from datetime import datetime as dt
-            j = session.query(Job).filter(Job.id == job_id).first()
-            if not j:
-                return
-            j.status = 'running'
-            j.started_at = dt.now()
-            session.commit()
-
-            q = session.query(Image)
-            if only_missing:
-                q = q.filter(
-                    (Image.camera_make.is_(None)) &
-                    (Image.camera_model.is_(None)) &
-                    (Image.date_taken.is_(None))
-                )
-            items = q.all()
-            total = len(items)
-            j.total_items = total
-            j.processed_items = 0
-            j.progress = 0
-            session.commit()
-
-            extractor = MetadataExtractor()
-            processed = 0
-            for im in items:
-                try:
-                    path = im.path
-                    if not path or not os.path.exists(path):
-                        continue
-                    md = extractor.extract_metadata(path)
-                    image_info = md.get('image_info', {})
-                    normalized = md.get('normalized', {})
-                    im.file_size = md.get('file_info', {}).get('size', im.file_size)
-                    im.width = image_info.get('width') or im.width
-                    im.height = image_info.get('height') or im.height
-                    im.aspect_ratio = image_info.get('aspect_ratio') or im.aspect_ratio
-                    im.format = image_info.get('format') or im.format
-                    im.camera_make = normalized.get('camera_make') or im.camera_make
-                    im.camera_model = normalized.get('camera_model') or im.camera_model
-                    im.lens_model = normalized.get('lens_model') or im.lens_model
-                    im.focal_length = normalized.get('focal_length') or im.focal_length
-                    im.aperture = normalized.get('aperture') or im.aperture
-                    im.shutter_speed = normalized.get('shutter_speed') or im.shutter_speed
-                    im.iso = normalized.get('iso') or im.iso
-                    if normalized.get('flash_used') is not None:
-                        im.flash_used = normalized.get('flash_used')
-                    im.date_taken = normalized.get('date_taken') or im.date_taken
-                except Exception:
-                    pass
-                processed += 1
-                if total:
-                    j.processed_items = processed
-                    j.progress = int(processed * 100 / total)
-                if processed % 50 == 0:
-                    session.commit()
-
-            j.processed_items = processed
-            j.progress = 100
-            j.status = 'completed'
-            j.completed_at = dt.now()
-            session.commit()
-        finally:
-            session.close()
-
-    background_tasks.add_task(_run, job.id, body.only_missing)
+    enqueue(background_tasks, "refresh_exif.run", job_tasks.run_refresh_exif, job.id, body.only_missing)
     return {"message": "Refresh EXIF job started", "job_id": job.id}
 
 @router.delete("/{job_id}")
-async def cancel_job(job_id: int, db: Session = Depends(get_db)):
+def cancel_job(job_id: int, db: Session = Depends(get_db)):
     """Cancel a pending job"""
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    if job.status == "running":
-        raise HTTPException(status_code=400, detail="Cannot cancel running job")
-    
-    if job.status in ["completed", "failed"]:
-        raise HTTPException(status_code=400, detail="Job already finished")
-    
-    job.status = "cancelled"
+    row = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status.notin_(["running", "completed", "failed"]))
+        .values(status="cancelled")
+        .returning(Job.id)
+    ).first()
     db.commit()
+
+    if row is None:
+        # Nothing updated; look up the status only to pick the right error
+        status = _job_status(db, job_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if status == "running":
+            raise HTTPException(status_code=400, detail="Cannot cancel running job")
+        raise HTTPException(status_code=400, detail="Job already finished")
     
     return {"message": "Job cancelled"}
 
 @router.post("/{job_id}/force-kill")
-async def force_kill_job(job_id: int, db: Session = Depends(get_db)):
+def force_kill_job(job_id: int, db: Session = Depends(get_db)):
     """Force-kill a specific running job immediately by marking it failed.
     Note: This does not terminate background execution, but updates job state so the UI reflects failure.
     """
     from datetime import datetime
 
-    job = db.query(Job).filter(Job.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+    row = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "running")
+        .values(
+            status="failed",
+            error_message="Job was force-killed by user",
+            completed_at=datetime.now(),
+        )
+        .returning(Job.id)
+    ).first()
+    db.commit()
 
-    if job.status != "running":
+    if row is None:
+        if _job_status(db, job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
         raise HTTPException(status_code=400, detail="Job is not running")
 
-    job.status = "failed"
-    job.error_message = "Job was force-killed by user"
-    job.completed_at = datetime.now()
-    db.commit()
-
-    return {"message": f"Force-killed job #{job.id}", "job_id": job.id}
+    return {"message": f"Force-killed job #{row.id}", "job_id": row.id}
 
 async def _placeholder_tagging_job(job_id: int):
     """Placeholder for ML tagging job - would integrate with ML worker"""
@@ -356,35 +370,51 @@ async def _placeholder_tagging_job(job_id: int):
         session.close()
 
 @router.post("/force-kill-stalled")
-async def force_kill_stalled_jobs(db: Session = Depends(get_db)):
+def force_kill_stalled_jobs(db: Session = Depends(get_db)):
     """Force-kill all running jobs that have been stalled (no progress in last 5 minutes)"""
     from datetime import datetime, timedelta
     
     # Find jobs that are "running" but haven't been updated recently
     five_minutes_ago = datetime.now() - timedelta(minutes=5)
     
-    stalled_jobs = db.query(Job).filter(
+    stalled = [
         Job.status == "running",
         Job.started_at < five_minutes_ago  # Started more than 5 minutes ago
-    ).all()
-    
-    if not stalled_jobs:
-        return {"message": "No stalled jobs found"}
-    
-    killed_jobs = []
-    for job in stalled_jobs:
-        # Force mark as failed with a clear message
-        job.status = "failed"
-        job.error_message = "Job was killed due to being stalled/unresponsive"
-        job.completed_at = datetime.now()
-        killed_jobs.append({
-            "id": job.id,
-            "type": job.type,
-            "progress": f"{job.processed_items or 0}/{job.total_items or 0}"
-        })
-    
+    ]
+    if db.get_bind().dialect.name == "postgresql":
+        # Claim the rows first; rows a worker is updating right now are skipped
+        # instead of blocking this request until the worker commits
+        claimed_ids = db.execute(
+            select(Job.id).where(*stalled).with_for_update(skip_locked=True)
+        ).scalars().all()
+        stalled = [Job.id.in_(claimed_ids)]
+
+    # Mark them failed in one UPDATE and read back what was killed
+    stmt = (
+        update(Job)
+        .where(*stalled)
+        .values(
+            status="failed",
+            error_message="Job was killed due to being stalled/unresponsive",
+            completed_at=datetime.now(),
+        )
+        .returning(Job.id, Job.type, Job.processed_items, Job.total_items)
+    )
+    rows = db.execute(stmt).all()
     db.commit()
-    
+
+    if not rows:
+        return {"message": "No stalled jobs found"}
+
+    killed_jobs = [
+        {
+            "id": row.id,
+            "type": row.type,
+            "progress": f"{row.processed_items or 0}/{row.total_items or 0}"
+        }
+        for row in rows
+    ]
+
     return {
         "message": f"Force-killed {len(killed_jobs)} stalled jobs",
         "killed_jobs": killed_jobs
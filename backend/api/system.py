@@ -1,26 +1,65 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import select, func, delete
 from backend.models import get_db, Image, Tag, Category, Job, PurgedImage
+from backend.models.image import image_tags, image_categories
 from backend.services.image_scanner import ImageScanner
-from backend.services.blacklist import add_blacklist_entry
+from backend.services.blacklist import add_blacklist_entries
 from backend.models import SessionLocal
+from backend.utils.http_cache import make_etag, not_modified
+from backend.utils.ttl_cache import async_ttl_cache
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 @router.get("/health")
 async def health_check():
     """API health check endpoint"""
     return {"status": "healthy"}
 
+# Images removed per bulk statement when purging, keeps IN lists bounded
+PURGE_CHUNK_SIZE = 5000
+
+def get_library_counts(db: Session) -> dict:
+    """Return image/tag/category/favorite counts in a single round trip"""
+    row = db.execute(select(
+        select(func.count(Image.id)).scalar_subquery().label("total_images"),
+        select(func.count(Tag.id)).scalar_subquery().label("total_tags"),
+        select(func.count(Category.id)).scalar_subquery().label("total_categories"),
+        # Filtered COUNT so the partial ix_images_favorite_true index answers it
+        select(func.count(Image.id)).where(Image.favorite == True).scalar_subquery().label("favorites"),
+    )).one()
+    return dict(row._mapping)
+
+# Seconds /stats counts are reused across polling clients
+STATS_CACHE_TTL = 5.0
+
+@async_ttl_cache(STATS_CACHE_TTL)
+async def cached_library_counts() -> dict:
+    """get_library_counts shared for STATS_CACHE_TTL seconds; bursts run one query"""
+    def _count():
+        session = SessionLocal()
+        try:
+            return get_library_counts(session)
+        finally:
+            session.close()
+    return await run_in_threadpool(_count)
+
 @router.get("/stats")
-async def get_stats(db: Session = Depends(get_db)):
+async def get_stats(request: Request, response: Response):
     """Get library statistics"""
-    total_images = db.query(Image).count()
-    total_tags = db.query(Tag).count()
-    total_categories = db.query(Category).count()
-    favorites = db.query(Image).filter(Image.favorite == True).count()
-    
+    counts = await cached_library_counts()
+    total_images = counts["total_images"]
+    total_tags = counts["total_tags"]
+    total_categories = counts["total_categories"]
+    favorites = counts["favorites"]
+
+    cached = not_modified(request, response, make_etag(total_images, total_tags, total_categories, favorites))
+    if cached:
+        return cached
+
     return {
         "total_images": total_images,
         "total_tags": total_tags,
@@ -29,7 +68,7 @@ async def get_stats(db: Session = Depends(get_db)):
     }
 
 @router.get("/blacklist")
-async def list_blacklist(filename: str = None, limit: int = 100, db: Session = Depends(get_db)):
+def list_blacklist(filename: str = None, limit: int = 100, db: Session = Depends(get_db)):
     """List purged/blacklisted entries for debugging. Optionally filter by filename."""
     q = db.query(PurgedImage).order_by(PurgedImage.id.desc())
     if filename:
@@ -38,7 +77,7 @@ async def list_blacklist(filename: str = None, limit: int = 100, db: Session = D
     return [r.to_dict() for r in rows]
 
 @router.post("/scan")
-async def scan_library(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def scan_library(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Trigger a library scan to index new images"""
     scanner = ImageScanner()
 
@@ -54,7 +93,7 @@ async def scan_library(background_tasks: BackgroundTasks, db: Session = Depends(
     return {"message": "Library scan started"}
 
 @router.post("/cleanup-orphaned")
-async def cleanup_orphaned_images(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+def cleanup_orphaned_images(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Clean up orphaned images (database entries with missing files)"""
     # Create a job to track progress
     job = Job(
@@ -92,38 +131,39 @@ async def cleanup_orphaned_images(background_tasks: BackgroundTasks, db: Session
     return {"message": "Orphaned image cleanup started", "job_id": job.id}
 
 @router.post("/purge-one-star-images")
-async def purge_one_star_images(db: Session = Depends(get_db)):
+def purge_one_star_images(db: Session = Depends(get_db)):
     """Purge all 1-star rated images and blacklist them from future scans"""
     try:
-        # Find all 1-star images
-        one_star_images = db.query(Image).filter(Image.rating == 1).all()
-        
-        if not one_star_images:
+        # Only the columns needed for the blacklist fingerprint are loaded
+        rows = db.execute(
+            select(
+                Image.id, Image.filename, Image.file_size, Image.width,
+                Image.height, Image.path, Image.local_path,
+            ).where(Image.rating == 1)
+        ).all()
+
+        if not rows:
             return {"message": "No 1-star images found", "purged_count": 0, "blacklisted_count": 0}
-        
+
         purged_count = 0
         blacklisted_count = 0
-        
-        for image in one_star_images:
-            # Create blacklist entry before deleting
-            add_blacklist_entry(db, image, "1-star rating")
-            blacklisted_count += 1
-            
+
+        for start in range(0, len(rows), PURGE_CHUNK_SIZE):
+            chunk = rows[start:start + PURGE_CHUNK_SIZE]
+            ids = [row.id for row in chunk]
+
+            # Blacklist entries need the file hash, so they are fingerprinted here
+            # and written with one multi-row INSERT per chunk
+            blacklisted_count += add_blacklist_entries(db, chunk, lambda row: "1-star rating")
+
             # Clear many-to-many associations to satisfy FK constraints (PostgreSQL)
-            try:
-                image.tags = []
-                image.categories = []
-            except Exception:
-                # If relationships are not loaded or fail to clear, continue with deletion attempt
-                pass
-
-            # Remove the image from database
-            db.delete(image)
-            purged_count += 1
-        
+            db.execute(delete(image_tags).where(image_tags.c.image_id.in_(ids)))
+            db.execute(delete(image_categories).where(image_categories.c.image_id.in_(ids)))
+            purged_count += db.execute(delete(Image).where(Image.id.in_(ids))).rowcount
+
         # Commit all changes
         db.commit()
-        
+
         return {
             "message": f"Purged {purged_count} 1-star images and added {blacklisted_count} to blacklist",
             "purged_count": purged_count,
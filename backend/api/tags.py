@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload, undefer
+from sqlalchemy import insert, func
 from typing import List, Optional, Dict
 from pydantic import BaseModel
 import logging
+import time
 
 from backend.models import get_db, Tag, Image
+from backend.models.image import image_tags
 from backend.services.ai_tagger import get_ai_tagger
+from backend.services.ai_tag_cache import generate_tags_cached
+from backend.workers.celery_app import enqueue
+from backend.workers.tagging import ensure_tags, normalize_tag_names, run_ai_tagging
 
 router = APIRouter()
 
@@ -24,6 +30,31 @@ class TagUpdate(BaseModel):
     name: Optional[str] = None
     color: Optional[str] = None
 
+def _tag_response(tag: Tag, image_count: int) -> TagResponse:
+    """Build a TagResponse with a precomputed image count (avoids loading tag.images)"""
+    return TagResponse(
+        id=tag.id,
+        name=tag.name,
+        color=tag.color,
+        created_at=tag.created_at.isoformat() if tag.created_at else None,
+        image_count=image_count,
+    )
+
+# Short-lived cache of GET /tags results keyed by (search, sort_by). Tag writes in
+# this process clear it; the TTL bounds staleness from writes elsewhere (image
+# edits, the tagging worker).
+TAG_LIST_CACHE_TTL = 30.0
+TAG_LIST_CACHE_MAX_ENTRIES = 256
+_tag_list_cache: Dict[tuple, tuple] = {}
+
+def invalidate_tag_list_cache():
+    """Drop cached GET /tags results after tags or tag assignments change"""
+    _tag_list_cache.clear()
+
+def _tag_image_count(db: Session, tag_id: int) -> int:
+    """Count a tag's images from the association table"""
+    return db.query(func.count(image_tags.c.image_id)).filter(image_tags.c.tag_id == tag_id).scalar()
+
 @router.get("/", response_model=List[TagResponse])
 async def get_tags(
     search: Optional[str] = None,
@@ -31,20 +62,31 @@ async def get_tags(
     db: Session = Depends(get_db)
 ):
     """Get all tags with optional search"""
-    query = db.query(Tag)
+    key = (search, sort_by)
+    cached = _tag_list_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    # Counts come from the association table in the same query; the outer join
+    # keeps tags that have no images
+    image_count = func.count(image_tags.c.image_id).label("image_count")
+    query = db.query(Tag, image_count).outerjoin(
+        image_tags, image_tags.c.tag_id == Tag.id
+    ).group_by(Tag.id)
     
     if search:
         query = query.filter(Tag.name.ilike(f"%{search}%"))
     
     if sort_by == "count":
-        # Sort by image count (requires subquery)
-        from sqlalchemy import func
-        query = query.join(Tag.images).group_by(Tag.id).order_by(func.count(Image.id).desc())
+        query = query.order_by(image_count.desc(), Tag.name)
     else:
         query = query.order_by(Tag.name)
     
-    tags = query.all()
-    return [TagResponse(**tag.to_dict()) for tag in tags]
+    result = [_tag_response(tag, count) for tag, count in query.all()]
+    if len(_tag_list_cache) >= TAG_LIST_CACHE_MAX_ENTRIES:
+        _tag_list_cache.clear()
+    _tag_list_cache[key] = (time.monotonic() + TAG_LIST_CACHE_TTL, result)
+    return result
 
 @router.post("/", response_model=TagResponse)
 async def create_tag(tag_data: TagCreate, db: Session = Depends(get_db)):
@@ -55,15 +97,19 @@ async def create_tag(tag_data: TagCreate, db: Session = Depends(get_db)):
     
     tag = Tag(name=tag_data.name, color=tag_data.color)
     db.add(tag)
+    # The INSERT returns id and created_at (eager_defaults), so the response is
+    # built right after the flush; a new tag has no images
+    db.flush()
+    response = _tag_response(tag, 0)
     db.commit()
-    db.refresh(tag)
+    invalidate_tag_list_cache()
     
-    return TagResponse(**tag.to_dict())
+    return response
 
 @router.get("/{tag_id}", response_model=TagResponse)
 async def get_tag(tag_id: int, db: Session = Depends(get_db)):
     """Get a specific tag by ID"""
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+    tag = db.query(Tag).options(undefer(Tag.image_count)).filter(Tag.id == tag_id).first()
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     
@@ -85,10 +131,12 @@ async def update_tag(tag_id: int, tag_data: TagUpdate, db: Session = Depends(get
     if tag_data.color:
         tag.color = tag_data.color
     
+    # Nothing server-side changes on update, so respond from the in-memory tag
+    response = _tag_response(tag, _tag_image_count(db, tag_id))
     db.commit()
-    db.refresh(tag)
+    invalidate_tag_list_cache()
     
-    return TagResponse(**tag.to_dict())
+    return response
 
 @router.delete("/{tag_id}")
 async def delete_tag(tag_id: int, db: Session = Depends(get_db)):
@@ -99,24 +147,28 @@ async def delete_tag(tag_id: int, db: Session = Depends(get_db)):
     
     db.delete(tag)
     db.commit()
+    invalidate_tag_list_cache()
     
     return {"message": "Tag deleted successfully"}
 
 @router.post("/bulk-create")
 async def bulk_create_tags(tag_names: List[str], db: Session = Depends(get_db)):
     """Create multiple tags at once"""
-    created_tags = []
-    
-    for tag_name in tag_names:
-        existing_tag = db.query(Tag).filter(Tag.name == tag_name).first()
-        if not existing_tag:
-            tag = Tag(name=tag_name)
-            db.add(tag)
-            created_tags.append(tag)
-    
+    # One lookup for all names, then one multi-row INSERT for the missing ones;
+    # the color comes from the Tag.color column default
+    existing_names = {name for (name,) in db.query(Tag.name).filter(Tag.name.in_(tag_names)).all()}
+    new_tags = [
+        {"name": name}
+        for name in dict.fromkeys(tag_names)
+        if name not in existing_names
+    ]
+    
+    if new_tags:
+        db.execute(insert(Tag), new_tags)
     db.commit()
+    invalidate_tag_list_cache()
     
-    return {"message": f"Created {len(created_tags)} tags", "created": len(created_tags)}
+    return {"message": f"Created {len(new_tags)} tags", "created": len(new_tags)}
 
 # AI Auto-Tagging Endpoints
 
@@ -134,8 +186,8 @@ async def auto_tag_single_image(
     """Generate AI tags for a single image"""
     logger = logging.getLogger(__name__)
     
-    # Get the image
-    image = db.query(Image).filter(Image.id == request.image_id).first()
+    # Get the image with its current tags in one extra query
+    image = db.query(Image).options(selectinload(Image.tags)).filter(Image.id == request.image_id).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
     
@@ -144,32 +196,26 @@ async def auto_tag_single_image(
         ai_tagger = get_ai_tagger()
         
         # Generate tags for the image
-        suggested_tags = ai_tagger.generate_tags(image.path)
+        suggested_tags = normalize_tag_names(generate_tags_cached(db, ai_tagger, image.path))
         
         if not suggested_tags:
             return {"message": "No tags could be generated for this image", "tags": []}
         
         # Create new tags if they don't exist and associate with image
+        tag_cache = {t.name: t for t in db.query(Tag).filter(Tag.name.in_(suggested_tags)).all()}
+        ensure_tags(db, tag_cache, suggested_tags)
+        # Associate tags the image doesn't have yet, checked against its tag ids
+        existing_ids = {t.id for t in image.tags}
         applied_tags = []
         for tag_name in suggested_tags:
-            # Check if tag exists
-            existing_tag = db.query(Tag).filter(Tag.name == tag_name).first()
-            if not existing_tag:
-                # Create new tag
-                new_tag = Tag(name=tag_name, color="#10B981")  # Green color for AI tags
-                db.add(new_tag)
-                db.commit()
-                db.refresh(new_tag)
-                tag = new_tag
-            else:
-                tag = existing_tag
-            
-            # Associate tag with image if not already associated
-            if tag not in image.tags:
-                image.tags.append(tag)
+            tag = tag_cache[tag_name]
+            if tag.id not in existing_ids:
+                image.tags.add(tag)
+                existing_ids.add(tag.id)
                 applied_tags.append(tag_name)
         
         db.commit()
+        invalidate_tag_list_cache()
         
         return {
             "message": f"Applied {len(applied_tags)} AI-generated tags",
@@ -191,9 +237,8 @@ async def auto_tag_batch_images(
     if not request.image_ids:
         raise HTTPException(status_code=400, detail="No image IDs provided")
     
-    # Verify all images exist
-    images = db.query(Image).filter(Image.id.in_(request.image_ids)).all()
-    found_ids = {img.id for img in images}
+    # Verify all images exist (ids only, no need to load the rows)
+    found_ids = {r[0] for r in db.query(Image.id).filter(Image.id.in_(request.image_ids)).all()}
     missing_ids = set(request.image_ids) - found_ids
     
     if missing_ids:
@@ -216,21 +261,19 @@ async def auto_tag_batch_images(
         parameters={"image_ids": request.image_ids}
     )
     db.add(job)
+    # The flush INSERT populates the id; no refresh is needed after commit
+    db.flush()
+    job_id = job.id
     db.commit()
-    db.refresh(job)
     
-    # Add background task
-    background_tasks.add_task(
-        _batch_auto_tag_images, 
-        request.image_ids,
-        job.id
-    )
+    # Hand off to the worker queue (in-process when no broker is configured)
+    enqueue(background_tasks, "ai_tagging.run", run_ai_tagging, job_id)
     
     return {
         "message": f"Started AI tagging for {len(request.image_ids)} images",
         "image_count": len(request.image_ids),
         "status": "processing",
-        "job_id": job.id
+        "job_id": job_id
     }
 
 @router.post("/auto-tag-all-untagged")
@@ -239,167 +282,36 @@ async def auto_tag_all_untagged(
     db: Session = Depends(get_db)
 ):
     """Generate AI tags for all images that have no tags"""
-    # Find images with no tags
-    untagged_images = db.query(Image).filter(~Image.tags.any()).all()
+    # Count images with no tags; the worker pages through them itself, so the
+    # ids are never materialized here or stored on the job
+    untagged_count = db.query(func.count(Image.id)).filter(~Image.tags.any()).scalar()
     
-    if not untagged_images:
+    if not untagged_count:
         return {"message": "No untagged images found"}
     
-    image_ids = [img.id for img in untagged_images]
-    
     # Create a job to track progress
     from backend.models import Job
     
     job = Job(
         type="ai_tagging",
         status="pending", 
-        total_items=len(image_ids),
+        total_items=untagged_count,
         processed_items=0,
         progress=0,
-        parameters={"image_ids": image_ids, "auto_tag_all": True}
+        parameters={"auto_tag_all": True}
     )
     db.add(job)
+    # The flush INSERT populates the id; no refresh is needed after commit
+    db.flush()
+    job_id = job.id
     db.commit()
-    db.refresh(job)
     
-    # Add background task
-    background_tasks.add_task(
-        _batch_auto_tag_images,
-        image_ids,
-        job.id
-    )
+    # Hand off to the worker queue (in-process when no broker is configured)
+    enqueue(background_tasks, "ai_tagging.run", run_ai_tagging, job_id)
     
     return {
-        "message": f"Started AI tagging for {len(image_ids)} untagged images",
-        "image_count": len(image_ids),
+        "message": f"Started AI tagging for {untagged_count} untagged images",
+        "image_count": untagged_count,
         "status": "processing",
-        "job_id": job.id
+        "job_id": job_id
     }
-
-async def _batch_auto_tag_images(image_ids: List[int], job_id: int):
-    """Background task to process batch AI tagging with proper session management"""
-    logger = logging.getLogger(__name__)
-    logger.info(f"Starting batch AI tagging for {len(image_ids)} images (job {job_id})")
-    
-    from backend.models import SessionLocal, Job
-    from datetime import datetime
-    
-    # Create our own database session for this background task
-    db = SessionLocal()
-    
-    try:
-        # Update job status to running
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if job:
-            job.status = "running"
-            job.started_at = datetime.utcnow()
-            db.commit()
-        
-        # Initialize AI tagger
-        ai_tagger = get_ai_tagger()
-        if not ai_tagger.initialize():
-            raise Exception("Failed to initialize AI tagger")
-        
-        processed = 0
-        total_tags_applied = 0
-        total_images = len(image_ids)
-        
-        # Process in smaller batches to prevent memory issues
-        batch_size = 5  # Process 5 images at a time
-        current_batch = 0
-        
-        for i, image_id in enumerate(image_ids):
-            # Add a small delay every batch to prevent overwhelming the system
-            if i > 0 and i % batch_size == 0:
-                import time
-                time.sleep(2)  # 2-second pause between batches
-                current_batch += 1
-                logger.info(f"Completed batch {current_batch}, processed {processed}/{total_images} images")
-            try:
-                # Get image (fresh query each time)
-                image = db.query(Image).filter(Image.id == image_id).first()
-                if not image:
-                    logger.warning(f"Image {image_id} not found, skipping")
-                    continue
-                
-                # Generate tags with error handling
-                try:
-                    suggested_tags = ai_tagger.generate_tags(image.path)
-                except Exception as tag_error:
-                    logger.error(f"Failed to generate tags for image {image_id} ({image.filename}): {tag_error}")
-                    suggested_tags = []
-                
-                if suggested_tags:
-                    tags_applied = 0
-                    for tag_name in suggested_tags:
-                        # Get or create tag
-                        existing_tag = db.query(Tag).filter(Tag.name == tag_name).first()
-                        if not existing_tag:
-                            new_tag = Tag(name=tag_name, color="#10B981")
-                            db.add(new_tag)
-                            db.flush()  # Get the ID without full commit
-                            tag = new_tag
-                        else:
-                            tag = existing_tag
-                        
-                        # Associate with image if not already
-                        if tag not in image.tags:
-                            image.tags.append(tag)
-                            tags_applied += 1
-                    
-                    # Commit after each image to avoid long transactions
-                    db.commit()
-                    total_tags_applied += tags_applied
-                    
-                processed += 1
-                
-                # Update job progress every 5 images or at the end
-                if processed % 5 == 0 or processed == total_images:
-                    if job:
-                        progress = int((processed / total_images) * 100)
-                        job.processed_items = processed
-                        job.progress = progress
-                        db.commit()
-                        logger.info(f"Progress: {processed}/{total_images} ({progress}%)")
-                    
-            except Exception as e:
-                logger.error(f"Failed to process image {image_id}: {e}")
-                continue
-        
-        # Mark job as completed
-        if job:
-            job.status = "completed"
-            job.completed_at = datetime.utcnow()
-            job.progress = 100
-            job.processed_items = processed
-            job.result = {
-                "processed_images": processed,
-                "total_tags_applied": total_tags_applied
-            }
-            db.commit()
-        
-        logger.info(f"Batch AI tagging completed: {processed} images processed, {total_tags_applied} tags applied")
-        
-    except Exception as e:
-        logger.error(f"Batch AI tagging failed: {e}")
-        
-        # Mark job as failed
-        try:
-            if job:
-                job.status = "failed"
-                job.error_message = str(e)
-                job.completed_at = datetime.utcnow()
-                db.commit()
-        except:
-            pass
-            
-    finally:
-        # Clean up resources
-        try:
-            if 'ai_tagger' in locals():
-                ai_tagger.cleanup()
-        except:
-            pass
-            
-        # Always close the database session
-        db.close()
\ No newline at end of file
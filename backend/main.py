@@ -1,20 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, Query, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 import os
 import time
+from urllib.parse import quote
 
 from backend.models import get_db, Base, engine, Image, Tag, Category, Job, SessionLocal
-from backend.models.schema_upgrade import ensure_schema
+from backend.models.schema_upgrade import init_schema
 from backend.api import images, tags, categories, jobs, watch, system
 from backend.services.image_scanner import ImageScanner
 from backend.services.thumbnail_generator import ThumbnailGenerator
 from backend.services.media_manager import MediaManager
 from backend.services.import_watcher import get_import_watcher
-from backend.utils.path_utils import get_container_path, get_container_root
+from backend.utils.path_utils import invalidate_serving_path, resolve_serving_path
+from backend.utils.http_cache import make_etag, not_modified, file_etag, etag_matches
+from backend.utils.ttl_cache import async_ttl_cache
+from backend.workers.celery_app import CELERY_BROKER_URL
 from PIL import ImageFile, Image as PILImage
 
 # Support HEIC/HEIF if pillow-heif is installed
@@ -24,17 +35,43 @@ try:
 except Exception:
     pass
 
+logger = logging.getLogger(__name__)
+
 # Allow truncated images to load rather than fail
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
-# Create/upgrade tables
-Base.metadata.create_all(bind=engine)
-ensure_schema(engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up the schema and background services on startup, stop them on shutdown"""
+    # Create/upgrade tables once the server starts (not at import), one process at a time
+    await run_in_threadpool(init_schema, engine, Base.metadata)
+
+    print("Starting import watcher...")
+    import_watcher = get_import_watcher()
+    import_watcher.start()
+    print(f"Import watcher started with status: {import_watcher.status()}")
+
+    # Load the AI tagger model off the event loop so startup isn't blocked. With a
+    # broker, batch tagging runs in the worker (which preloads its own copy), so by
+    # default the API only loads the model for its first one-off suggestion.
+    preload_default = "false" if CELERY_BROKER_URL else "true"
+    if os.getenv("AI_TAGGER_PRELOAD", preload_default).lower() == "true":
+        import threading
+        from backend.services.ai_tagger import preload_ai_tagger
+        threading.Thread(target=preload_ai_tagger, name="ai-tagger-preload", daemon=True).start()
+        print("AI tagger preload started")
+
+    yield
+
+    print("Stopping import watcher...")
+    import_watcher.stop()
+    print("Import watcher stopped")
 
 app = FastAPI(
     title="AI Image Library API",
     description="API for managing AI-generated image collections",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -54,11 +91,28 @@ app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
 app.include_router(watch.router, prefix="/api/watch", tags=["watch"])
 app.include_router(system.router, prefix="/api", tags=["system"])
 
-# Also include without /api prefix for backward compatibility and direct access
-app.include_router(images.router, prefix="/images", tags=["images-direct"])
-app.include_router(tags.router, prefix="/tags", tags=["tags-direct"])
-app.include_router(categories.router, prefix="/categories", tags=["categories-direct"])
-app.include_router(jobs.router, prefix="/jobs", tags=["jobs-direct"])
+# The same routers are also reachable without the /api prefix for backward
+# compatibility and direct access. Rather than registering every route twice
+# (Starlette matches routes by linear scan), legacy paths are rewritten onto
+# the /api routes before routing.
+LEGACY_PREFIXES = ("/images", "/tags", "/categories", "/jobs")
+
+class LegacyPrefixMiddleware:
+    """Rewrite /images/..., /tags/..., /categories/... and /jobs/... to /api/..."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope["path"]
+            for prefix in LEGACY_PREFIXES:
+                if path.startswith(prefix) and (len(path) == len(prefix) or path[len(prefix)] == "/"):
+                    scope = dict(scope, path="/api" + path)
+                    break
+        await self.app(scope, receive, send)
+
+app.add_middleware(LegacyPrefixMiddleware)
 
 # Ensure required directories exist (important for NAS/local)
 THUMBNAILS_DIR = os.getenv("THUMBNAILS_DIR", "/thumbnails")
@@ -112,6 +166,9 @@ async def scan_library(background_tasks: BackgroundTasks, db: Session = Depends(
     background_tasks.add_task(_run_scan)
     return {"message": "Library scan started"}
 
+# Images loaded per page while creating local media copies
+MEDIA_COPY_BATCH_SIZE = 500
+
 @app.post("/create-media-copies")
 async def create_media_copies(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Create local media copies for all images that don't have them"""
@@ -120,17 +177,36 @@ async def create_media_copies(background_tasks: BackgroundTasks, db: Session = D
     def _create_media_copies():
         session = SessionLocal()
         try:
-            # Find images without local copies
-            images_without_copies = session.query(Image).filter(Image.local_path.is_(None)).all()
-            print(f"DEBUG: Found {len(images_without_copies)} images without local copies")
-            
+            # Find images without local copies, a page at a time by id so the
+            # full set is never loaded; ids only move forward, so images that
+            # fail to copy (and stay NULL) are not picked up again. Each page's
+            # local_path writes go out as one bulk UPDATE and one commit.
             success_count = 0
-            for image in images_without_copies:
-                if media_manager.update_image_local_path(session, image):
-                    success_count += 1
-                    print(f"DEBUG: Created local copy for image {image.id}: {image.filename}")
-                else:
-                    print(f"DEBUG: Failed to create local copy for image {image.id}: {image.filename}")
+            last_id = 0
+            while True:
+                images_without_copies = (
+                    session.query(Image.id, Image.path, Image.filename)
+                    .filter(Image.local_path.is_(None), Image.id > last_id)
+                    .order_by(Image.id)
+                    .limit(MEDIA_COPY_BATCH_SIZE)
+                    .all()
+                )
+                if not images_without_copies:
+                    break
+                last_id = images_without_copies[-1].id
+                print(f"DEBUG: Found {len(images_without_copies)} images without local copies")
+                
+                updates = []
+                for image_id, path, filename in images_without_copies:
+                    local_path = media_manager.ensure_local_copy(path, filename) if path else None
+                    if local_path:
+                        updates.append({"id": image_id, "local_path": local_path})
+                    else:
+                        print(f"DEBUG: Failed to create local copy for image {image_id}: {filename}")
+                if updates:
+                    session.bulk_update_mappings(Image, updates)
+                    session.commit()
+                    success_count += len(updates)
             
             print(f"DEBUG: Successfully created {success_count} local media copies")
         finally:
@@ -139,71 +215,80 @@ async def create_media_copies(background_tasks: BackgroundTasks, db: Session = D
     background_tasks.add_task(_create_media_copies)
     return {"message": "Media copy creation started"}
 
-def _get_image_serving_path(image: Image) -> Optional[str]:
-    """Get the best path to serve an image (prefer local copy, fallback to original)"""
-    print(f"DEBUG: ============ Resolving path for image {image.id} ============")
-    print(f"DEBUG: Original stored path: {image.path}")
-    print(f"DEBUG: Local path: {image.local_path}")
-    
-    # First try local media copy
-    if image.local_path and os.path.exists(image.local_path):
-        print(f"DEBUG: ✅ Using local media copy: {image.local_path}")
-        return image.local_path
-    
-    # Fallback to original path with volume mapping
-    if not image.path:
-        print(f"DEBUG: ❌ No path available for image {image.id}")
-        return None
-    
-    # Check if original path exists as-is (shouldn't in container, but let's check)
-    print(f"DEBUG: Checking if original path exists: {image.path}")
-    if os.path.exists(image.path):
-        print(f"DEBUG: ✅ Using original path (unexpected in container): {image.path}")
-        return image.path
-    else:
-        print(f"DEBUG: ❌ Original path does not exist: {image.path}")
-    
-    mapped = get_container_path(image.path)
-    if mapped and mapped != image.path:
-        print(f"DEBUG: Trying mapped path: {mapped}")
-        if os.path.exists(mapped):
-            print(f"DEBUG: ✅ Using mapped path: {mapped}")
-            return mapped
-        else:
-            print(f"DEBUG: ❌ Mapped path does not exist: {mapped}")
-    elif mapped:
-        print(f"DEBUG: Checking mapped path: {mapped}")
-        if os.path.exists(mapped):
-            print(f"DEBUG: ✅ Using mapped path: {mapped}")
-            return mapped
-        else:
-            print(f"DEBUG: ❌ Mapped path does not exist: {mapped}")
-
-    # List what's actually in /library to debug
-    try:
-        mount_root = get_container_root()
-        library_contents = os.listdir(mount_root)[:10]  # First 10 items
-        print(f"DEBUG: Contents of {mount_root}: {library_contents}")
-    except Exception as e:
-        print(f"DEBUG: Error listing {mount_root}: {e}")
-    
-    print(f"DEBUG: ❌ No valid path found for image {image.id}")
-    return None
+# The only image columns the file-serving endpoints read
+_SERVING_COLUMNS = (Image.id, Image.path, Image.local_path, Image.filename)
+
+def _get_image_serving_path(image) -> Optional[str]:
+    """Get the best path to serve an image (prefer local copy, fallback to original).
+    Accepts an Image or any row with id, local_path and path.
+    """
+    return resolve_serving_path(image.id, image.local_path, image.path)
+
+def _reresolve_image_serving_path(image) -> Optional[str]:
+    """Drop a cached serving path that no longer exists (copy deleted, mount
+    changed) and resolve again, falling back to the original/mapped path
+    """
+    invalidate_serving_path(image.id, image.local_path, image.path)
+    return _get_image_serving_path(image)
+
+async def _find_image_to_serve(
+    db: Session, image_id: int
+) -> Tuple[Optional[Row], Optional[str], Optional[os.stat_result]]:
+    """Load an image's serving columns (not the full ORM object), resolve its serving path and stat it in the threadpool.
+    All three are blocking (DB round trip, stat calls) and would otherwise
+    stall the event loop for every concurrent request. The stat is handed to
+    FileResponse, which then doesn't stat the file again.
+    """
+    def _find():
+        image = db.query(*_SERVING_COLUMNS).filter(Image.id == image_id).first()
+        serving_path = _get_image_serving_path(image) if image else None
+        try:
+            st = os.stat(serving_path) if serving_path else None
+        except OSError:
+            serving_path, st = _reresolve_image_serving_path(image), None
+            try:
+                st = os.stat(serving_path) if serving_path else None
+            except OSError:
+                serving_path = None
+        return image, serving_path, st
+    return await run_in_threadpool(_find)
+
+# Originals are revalidated by ETag after a day; replaced files get a new ETag
+IMAGE_FILE_CACHE_CONTROL = "public, max-age=86400"
+
+# When set (e.g. /_accel), image files are handed to the fronting nginx with
+# X-Accel-Redirect: {prefix}{absolute path} instead of being streamed by Python.
+# nginx needs a matching `internal` location and the same files mounted.
+ACCEL_REDIRECT_PREFIX = os.getenv("ACCEL_REDIRECT_PREFIX", "").rstrip("/")
+
+def _image_file_response(path: str, st: os.stat_result, headers: dict, media_type: str) -> Response:
+    """FileResponse, or an empty X-Accel-Redirect response when nginx serves the file"""
+    if ACCEL_REDIRECT_PREFIX:
+        headers = {**headers, "X-Accel-Redirect": quote(ACCEL_REDIRECT_PREFIX + path)}
+        return Response(headers=headers, media_type=media_type)
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=st)
+
+# Media types served for original image files, keyed by lowercase extension
+_MEDIA_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif',
+    'bmp': 'image/bmp',
+    'tiff': 'image/tiff',
+    'tif': 'image/tiff'
+}
+
+# Extensions accepted by the /{image_id}.{ext} route
+_VALID_IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'tiff'})
 
 def _get_media_type(filename: str) -> str:
     """Get appropriate media type based on file extension"""
-    ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    media_types = {
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg', 
-        'png': 'image/png',
-        'webp': 'image/webp',
-        'gif': 'image/gif',
-        'bmp': 'image/bmp',
-        'tiff': 'image/tiff',
-        'tif': 'image/tiff'
-    }
-    return media_types.get(ext, 'application/octet-stream')
+    _, dot, ext = filename.rpartition('.')
+    if not dot:
+        return 'application/octet-stream'
+    return _MEDIA_TYPES.get(ext.lower(), 'application/octet-stream')
 
 @app.get("/preview-file/{image_id}")
 async def serve_preview_file(
@@ -214,11 +299,13 @@ async def serve_preview_file(
     """Serve a medium-sized preview image, generated and cached on demand.
     The longest side will be scaled to `size` pixels, preserving aspect ratio.
     """
-    image = db.query(Image).filter(Image.id == image_id).first()
+    image = db.query(*_SERVING_COLUMNS).filter(Image.id == image_id).first()
     if not image:
         raise HTTPException(status_code=404, detail="Image not found")
 
     src_path = _get_image_serving_path(image)
+    if src_path and not os.path.exists(src_path):
+        src_path = _reresolve_image_serving_path(image)
     if not src_path or not os.path.exists(src_path):
         raise HTTPException(status_code=404, detail="Source image not accessible")
 
@@ -266,93 +353,165 @@ async def serve_preview_file(
 @app.get("/image-file/{image_id}")
 async def serve_image_file(image_id: int, download: bool = False, db: Session = Depends(get_db)):
     """Serve the original image file"""
-    image = db.query(Image).filter(Image.id == image_id).first()
+    image, serving_path, st = await _find_image_to_serve(db, image_id)
     if not image:
-        print(f"DEBUG: Image {image_id} not found in database")
+        logger.debug("Image %s not found in database", image_id)
         raise HTTPException(status_code=404, detail="Image not found")
     
-    print(f"DEBUG: Found image {image_id}: {image.filename}")
-    print(f"DEBUG: Original path: {image.path}")
-    print(f"DEBUG: Local path: {image.local_path}")
+    logger.debug("Found image %s: %s (path=%s, local_path=%s)", image_id, image.filename, image.path, image.local_path)
     
-    # Get the best serving path (prefer local copy)
-    serving_path = _get_image_serving_path(image)
+    # serving_path is the best serving path (prefers the local copy)
     if not serving_path:
-        print(f"DEBUG: No accessible path found for image {image_id}")
+        logger.debug("No accessible path found for image %s", image_id)
         raise HTTPException(status_code=404, detail="Image file not found")
     
-    print(f"DEBUG: Serving from: {serving_path}")
-    file_size = os.path.getsize(serving_path)
-    print(f"DEBUG: File size: {file_size} bytes")
+    logger.debug("Serving from: %s", serving_path)
     
     # Set appropriate headers and media type
     headers = {}
     if download:
         headers["Content-Disposition"] = f'attachment; filename="{image.filename}"'
         media_type = "application/octet-stream"
-        print(f"DEBUG: Setting download headers for {image.filename}")
+        logger.debug("Setting download headers for %s", image.filename)
     else:
         media_type = _get_media_type(image.filename)
-        print(f"DEBUG: Using media type: {media_type}")
+        logger.debug("Using media type: %s", media_type)
     
-    print(f"DEBUG: Serving file: {serving_path}")
-    return FileResponse(
-        serving_path,
-        headers=headers,
-        media_type=media_type
-    )
+    return _image_file_response(serving_path, st, headers, media_type)
 
 @app.get("/{image_id}.{ext:path}")
-async def serve_image_by_filename(image_id: int, ext: str, db: Session = Depends(get_db)):
+async def serve_image_by_filename(image_id: int, ext: str, request: Request, db: Session = Depends(get_db)):
     """Serve original image by ID with file extension (for direct filename requests)"""
-    print(f"DEBUG: Route called with image_id={image_id}, ext={ext}")
+    logger.debug("Route called with image_id=%s, ext=%s", image_id, ext)
     
     # Validate that image_id is numeric and ext is a valid image extension
-    valid_extensions = {'jpg', 'jpeg', 'png', 'webp', 'gif', 'bmp', 'tiff'}
-    if ext.lower() not in valid_extensions:
-        print(f"DEBUG: Invalid extension '{ext}'")
+    if ext.lower() not in _VALID_IMAGE_EXTENSIONS:
+        logger.debug("Invalid extension '%s'", ext)
         raise HTTPException(status_code=404, detail="Invalid image format")
     
     # Serve original image (not thumbnail)
-    print(f"DEBUG: Looking up image with ID {image_id} in database")
-    image = db.query(Image).filter(Image.id == image_id).first()
+    logger.debug("Looking up image with ID %s in database", image_id)
+    image, serving_path, st = await _find_image_to_serve(db, image_id)
     if not image:
-        print(f"DEBUG: No image found in database with ID {image_id}")
+        logger.debug("No image found in database with ID %s", image_id)
         raise HTTPException(status_code=404, detail="Image not found")
     
-    print(f"DEBUG: Found image in database: {image.path}")
-    print(f"DEBUG: Local path: {image.local_path}")
+    logger.debug("Found image in database: %s (local_path=%s)", image.path, image.local_path)
     
-    # Get the best serving path (prefer local copy)
-    serving_path = _get_image_serving_path(image)
+    # serving_path is the best serving path (prefers the local copy)
     if not serving_path:
-        print(f"DEBUG: No accessible path found for image {image_id}")
+        logger.debug("No accessible path found for image %s", image_id)
         raise HTTPException(status_code=404, detail="Image file not found")
     
-    print(f"DEBUG: Serving from: {serving_path}")
+    # Browsers revalidate with If-None-Match; an unchanged file is a bodiless 304
+    etag = file_etag(st)
+    headers = {"ETag": etag, "Cache-Control": IMAGE_FILE_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    
     media_type = _get_media_type(image.filename)
-    print(f"DEBUG: Serving image file: {serving_path} with media type: {media_type}")
-    return FileResponse(serving_path, media_type=media_type)
+    logger.debug("Serving from: %s with media type: %s", serving_path, media_type)
+    return _image_file_response(serving_path, st, headers, media_type)
+
+# Parallel existence checks for diagnostics; stat on network storage is RTT-bound
+# and releases the GIL, so a few threads overlap the round trips
+DEBUG_STAT_WORKERS = 8
+_stat_executor = ThreadPoolExecutor(max_workers=DEBUG_STAT_WORKERS)
 
 @app.get("/debug/images")
 async def debug_images(db: Session = Depends(get_db)):
     """Debug endpoint to check image IDs and paths in database"""
-    images = db.query(Image).order_by(Image.id.desc()).limit(10).all()
+    images = db.query(Image.id, Image.path, Image.filename).order_by(Image.id.desc()).limit(10).all()
+    loop = asyncio.get_running_loop()
+    exists = await asyncio.gather(*(
+        loop.run_in_executor(_stat_executor, os.path.exists, img.path) for img in images if img.path
+    ))
+    exists_by_id = dict(zip((img.id for img in images if img.path), exists))
     return {
         "recent_images": [
             {
                 "id": img.id,
                 "path": img.path,
                 "filename": img.filename,
-                "exists": os.path.exists(img.path) if img.path else False
+                "exists": exists_by_id.get(img.id, False)
             }
             for img in images
         ]
     }
 
-@app.get("/debug/filesystem")
-async def debug_filesystem():
-    """Debug endpoint to check if library directory is mounted and has files"""
+# Seconds polled diagnostics (/media-stats, /debug/filesystem) are reused
+POLLED_CACHE_TTL = 5.0
+
+_DEBUG_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.tiff', '.bmp')
+
+def _iter_image_files(root: str, limit: int):
+    """Yield up to `limit` (path, filename, size) image entries under root.
+    Uses scandir so directory checks come from the readdir data, and stops as
+    soon as enough images are found instead of walking the whole tree.
+    """
+    stack = [root]
+    count = 0
+    while stack and count < limit:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue  # unreadable directory
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+                    if not entry.name.lower().endswith(_DEBUG_IMAGE_EXTENSIONS):
+                        continue
+                    size = entry.stat().st_size
+                except OSError:
+                    continue  # broken symlink or file removed mid-scan; keep the rest
+                yield entry.path, entry.name, size
+                count += 1
+                if count >= limit:
+                    return
+
+# Library roots described in parallel by /debug/filesystem
+DEBUG_LIBRARY_WORKERS = 4
+
+def _describe_library_path(library_path: str) -> dict:
+    """Existence, subdirectories and a few sample images for one library root"""
+    path_info = {
+        "exists": os.path.exists(library_path),
+        "is_dir": os.path.isdir(library_path) if os.path.exists(library_path) else False,
+        "files": [],
+        "subdirs": []
+    }
+    
+    if os.path.exists(library_path):
+        try:
+            if os.path.isdir(library_path):
+                contents = os.listdir(library_path)
+                path_info["total_items"] = len(contents)
+                
+                # List subdirectories
+                for item in contents:
+                    item_path = os.path.join(library_path, item)
+                    if os.path.isdir(item_path):
+                        path_info["subdirs"].append(item)
+                
+                # Get first 10 image files
+                for file_path, filename, size in _iter_image_files(library_path, 10):
+                    path_info["files"].append({
+                        "path": file_path,
+                        "filename": filename,
+                        "size": size
+                    })
+            else:
+                path_info["error"] = "Path exists but is not a directory"
+        except Exception as e:
+            path_info["error"] = str(e)
+    
+    return path_info
+
+def _collect_filesystem_info() -> dict:
+    """Describe the root directory and each configured library path"""
     result = {
         "environment": {
             "LIBRARY_PATHS": os.getenv('LIBRARY_PATHS', 'not set'),
@@ -376,58 +535,36 @@ async def debug_filesystem():
     library_paths_str = os.getenv('LIBRARY_PATHS', '/library')
     library_paths = [path.strip() for path in library_paths_str.split(',')]
     
-    for library_path in library_paths:
-        path_info = {
-            "exists": os.path.exists(library_path),
-            "is_dir": os.path.isdir(library_path) if os.path.exists(library_path) else False,
-            "files": [],
-            "subdirs": []
-        }
-        
-        if os.path.exists(library_path):
-            try:
-                if os.path.isdir(library_path):
-                    contents = os.listdir(library_path)
-                    path_info["total_items"] = len(contents)
-                    
-                    # List subdirectories
-                    for item in contents:
-                        item_path = os.path.join(library_path, item)
-                        if os.path.isdir(item_path):
-                            path_info["subdirs"].append(item)
-                    
-                    # Get first 10 image files
-                    image_count = 0
-                    for root, dirs, files in os.walk(library_path):
-                        for file in files:
-                            if file.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.tiff', '.bmp')):
-                                path_info["files"].append({
-                                    "path": os.path.join(root, file),
-                                    "filename": file,
-                                    "size": os.path.getsize(os.path.join(root, file))
-                                })
-                                image_count += 1
-                                if image_count >= 10:
-                                    break
-                        if image_count >= 10:
-                            break
-                else:
-                    path_info["error"] = "Path exists but is not a directory"
-            except Exception as e:
-                path_info["error"] = str(e)
-        
-        result["library_paths"][library_path] = path_info
+    # Roots are often separate NAS mounts; check them concurrently so the wall
+    # time is the slowest mount rather than the sum of all of them
+    with ThreadPoolExecutor(max_workers=min(DEBUG_LIBRARY_WORKERS, len(library_paths))) as ex:
+        result["library_paths"] = dict(zip(library_paths, ex.map(_describe_library_path, library_paths)))
     
     return result
 
+@async_ttl_cache(POLLED_CACHE_TTL)
+async def _cached_filesystem_info() -> dict:
+    return await run_in_threadpool(_collect_filesystem_info)
+
+@app.get("/debug/filesystem")
+async def debug_filesystem(response: Response):
+    """Debug endpoint to check if library directory is mounted and has files"""
+    response.headers["Cache-Control"] = f"max-age={int(POLLED_CACHE_TTL)}"
+    return await _cached_filesystem_info()
+
 @app.get("/stats")
-async def get_stats(db: Session = Depends(get_db)):
+async def get_stats(request: Request, response: Response):
     """Get library statistics"""
-    total_images = db.query(Image).count()
-    total_tags = db.query(Tag).count()
-    total_categories = db.query(Category).count()
-    favorites = db.query(Image).filter(Image.favorite == True).count()
-    
+    counts = await system.cached_library_counts()
+    total_images = counts["total_images"]
+    total_tags = counts["total_tags"]
+    total_categories = counts["total_categories"]
+    favorites = counts["favorites"]
+
+    cached = not_modified(request, response, make_etag(total_images, total_tags, total_categories, favorites))
+    if cached:
+        return cached
+
     return {
         "total_images": total_images,
         "total_tags": total_tags,
@@ -435,13 +572,18 @@ async def get_stats(db: Session = Depends(get_db)):
         "favorites": favorites
     }
 
-@app.get("/media-stats")
-async def get_media_stats(db: Session = Depends(get_db)):
-    """Get media management statistics"""
+def _collect_media_stats() -> dict:
     media_manager = MediaManager(MEDIA_DIR)
     
-    total_images = db.query(Image).count()
-    images_with_copies = db.query(Image).filter(Image.local_path.isnot(None)).count()
+    db = SessionLocal()
+    try:
+        # Plain COUNT(*) statements; Query.count() wraps the query in a subquery
+        total_images = db.execute(select(func.count()).select_from(Image)).scalar()
+        images_with_copies = db.execute(
+            select(func.count()).select_from(Image).where(Image.local_path.isnot(None))
+        ).scalar()
+    finally:
+        db.close()
     
     media_stats = media_manager.get_media_stats()
     
@@ -452,20 +594,12 @@ async def get_media_stats(db: Session = Depends(get_db)):
         "media_directory": media_stats
     }
 
-# Startup event to initialize import watcher
-@app.on_event("startup")
-async def startup_event():
-    """Start background services on app startup"""
-    print("Starting import watcher...")
-    import_watcher = get_import_watcher()
-    import_watcher.start()
-    print(f"Import watcher started with status: {import_watcher.status()}")
+@async_ttl_cache(POLLED_CACHE_TTL)
+async def _cached_media_stats() -> dict:
+    return await run_in_threadpool(_collect_media_stats)
 
-# Shutdown event to cleanup import watcher
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Clean up background services on app shutdown"""
-    print("Stopping import watcher...")
-    import_watcher = get_import_watcher()
-    import_watcher.stop()
-    print("Import watcher stopped")
+@app.get("/media-stats")
+async def get_media_stats(response: Response):
+    """Get media management statistics"""
+    response.headers["Cache-Control"] = f"max-age={int(POLLED_CACHE_TTL)}"
+    return await _cached_media_stats()
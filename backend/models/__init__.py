@@ -5,6 +5,7 @@ from .category import Category
 from .job import Job
 from .duplicate_ignore import DuplicateIgnore
 from .purged_image import PurgedImage
+from .ai_tag_cache import AITagCache
 
 __all__ = [
     "Base",
@@ -16,5 +17,6 @@ __all__ = [
     "Category",
     "Job",
     "DuplicateIgnore",
-    "PurgedImage"
+    "PurgedImage",
+    "AITagCache"
 ]
\ No newline at end of file
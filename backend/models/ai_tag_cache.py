@@ -0,0 +1,20 @@
+from sqlalchemy import Column, String, DateTime, JSON, Index
+from sqlalchemy.sql import func
+from .database import Base
+
+
+class AITagCache(Base):
+    """AI tag suggestions keyed by file content, so re-tagging unchanged files skips the model"""
+    __tablename__ = "ai_tag_cache"
+
+    file_hash = Column(String(128), primary_key=True)  # SHA-256 of the file bytes
+    model_version = Column(String(128), primary_key=True)
+    tags = Column(JSON, nullable=False)
+    phash = Column(String(64), nullable=True)  # perceptual hash, for near-duplicate reuse
+    # Digest of path + size + mtime of the file last tagged, to skip hashing unchanged files
+    source_key = Column(String(64), nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_ai_tag_cache_source_key', 'model_version', 'source_key'),
+    )
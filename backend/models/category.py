@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, ForeignKey, select
+from sqlalchemy.orm import relationship, column_property
 from sqlalchemy.sql import func
 from .database import Base
 from .image import image_categories
@@ -21,6 +21,15 @@ class Category(Base):
     # Relationships
     images = relationship("Image", secondary=image_categories, back_populates="categories")
     
+    # Counted in SQL on first access instead of loading every related Image
+    image_count = column_property(
+        select(func.count(image_categories.c.image_id))
+        .where(image_categories.c.category_id == id)
+        .correlate_except(image_categories)
+        .scalar_subquery(),
+        deferred=True,
+    )
+    
     def to_dict(self):
         return {
             "id": self.id,
@@ -31,5 +40,5 @@ class Category(Base):
             "featured_image_id": getattr(self, 'featured_image_id', None),
             "featured_image_position": getattr(self, 'featured_image_position', None),
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "image_count": len(self.images)
+            "image_count": self.image_count or 0
         }
@@ -1,8 +1,13 @@
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, Table, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+import os
 from .database import Base
 
+# Loader strategy for Image relationships. With TESTING=true any implicit lazy load
+# raises instead of silently issuing SQL, so endpoints must selectinload() what they use.
+RELATIONSHIP_LAZY = "raise_on_sql" if os.getenv("TESTING", "false").lower() == "true" else "select"
+
 # Association table for many-to-many relationship between images and tags
 image_tags = Table(
     'image_tags',
@@ -55,14 +60,18 @@ class Image(Base):
     indexed_at = Column(DateTime, server_default=func.now())
     
     # Relationships
-    tags = relationship("Tag", secondary=image_tags, back_populates="images")
-    categories = relationship("Category", secondary=image_categories, back_populates="images")
+    # Set-backed so membership checks and adds are hashed rather than list scans
+    tags = relationship("Tag", secondary=image_tags, back_populates="images", lazy=RELATIONSHIP_LAZY, collection_class=set)
+    categories = relationship("Category", secondary=image_categories, back_populates="images", lazy=RELATIONSHIP_LAZY)
     
     @property
     def thumbnail_path(self):
         return f"/thumbnails/{self.id}.jpg"
     
     def to_dict(self):
+        # Reads self.tags and self.categories: load images with
+        # .options(selectinload(Image.tags), selectinload(Image.categories)),
+        # otherwise every serialized image costs two more SELECTs.
         return {
             "id": self.id,
             "path": self.path,
@@ -87,7 +96,7 @@ class Image(Base):
             "modified_at": self.modified_at.isoformat() if self.modified_at else None,
             "indexed_at": self.indexed_at.isoformat() if self.indexed_at else None,
             "thumbnail_path": self.thumbnail_path,
-            "tags": [tag.name for tag in self.tags],
+            "tags": sorted(tag.name for tag in self.tags),
             "categories": [cat.name for cat in self.categories],
             # AI-specific fields (for backwards compatibility with original AI image app)
             "prompt": getattr(self, 'prompt', None),
@@ -1,3 +1,4 @@
+from datetime import datetime
 from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON
 from sqlalchemy.sql import func
 from .database import Base
@@ -21,6 +22,8 @@ class Job(Base):
     created_at = Column(DateTime, server_default=func.now())
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
+    # Python-side timestamps keep sub-second resolution (SQLite CURRENT_TIMESTAMP is whole seconds)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
     def to_dict(self):
         return {
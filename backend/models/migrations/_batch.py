@@ -0,0 +1,73 @@
+"""
+Batched SQLite column migrations.
+Runs one PRAGMA table_info per table and only the missing ALTER TABLEs, all on a
+single connection and inside one transaction.
+"""
+
+import os
+import sqlite3
+from typing import Iterable, Optional
+
+# table -> {column: ALTER TABLE column definition}
+SQLITE_COLUMNS = {
+    'categories': {
+        'featured': "featured BOOLEAN DEFAULT FALSE",
+        'featured_image_id': "featured_image_id INTEGER",
+        'featured_image_position': "featured_image_position TEXT",
+    },
+    'images': {
+        'phash': "phash TEXT",
+    },
+}
+
+
+def sqlite_db_path(db_url: str) -> str:
+    if db_url.startswith('sqlite:///'):
+        return db_url.replace('sqlite:///', '')
+    return './app.db'
+
+
+def migrate(tables: Optional[Iterable[str]] = None, columns: Optional[Iterable[str]] = None):
+    """Add any missing columns from SQLITE_COLUMNS, optionally only for the given
+    tables and, within them, only the given column names
+    """
+
+    db_url = os.getenv('DB_URL', 'sqlite:///./app.db')
+    if db_url.startswith('postgresql://'):
+        print("PostgreSQL is not handled by the batched SQLite migration")
+        return
+
+    db_path = sqlite_db_path(db_url)
+    if not os.path.exists(db_path):
+        print(f"Database file not found: {db_path}")
+        return
+
+    wanted = set(columns) if columns is not None else None
+    targets = {
+        t: {name: ddl for name, ddl in SQLITE_COLUMNS[t].items() if wanted is None or name in wanted}
+        for t in (tables or SQLITE_COLUMNS)
+    }
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN")
+        for table, needed in targets.items():
+            cursor.execute(f"PRAGMA table_info({table})")
+            existing = {column[1] for column in cursor.fetchall()}
+            for name, ddl in needed.items():
+                if name in existing:
+                    print(f"Column '{name}' already exists in {table} table")
+                    continue
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {ddl}")
+                print(f"Added '{name}' column to {table} table")
+        cursor.execute("COMMIT")
+    except Exception as e:
+        print(f"Error migrating columns: {e}")
+        cursor.execute("ROLLBACK")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    migrate()
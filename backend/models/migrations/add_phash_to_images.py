@@ -3,14 +3,18 @@ Add perceptual hash (phash) column to images table.
 """
 
 import os
-import sqlite3
-import psycopg2
+
+try:
+    from ._batch import migrate as batch_migrate
+except ImportError:  # run as a script
+    from _batch import migrate as batch_migrate
 
 
 def migrate():
     db_url = os.getenv('DB_URL', 'sqlite:///./app.db')
 
     if db_url.startswith('postgresql://'):
+        import psycopg2
         conn = psycopg2.connect(db_url)
         try:
             with conn.cursor() as cur:
@@ -25,29 +29,7 @@ def migrate():
             conn.close()
         return
 
-    # SQLite
-    if db_url.startswith('sqlite:///'):
-        db_path = db_url.replace('sqlite:///', '')
-    else:
-        db_path = './app.db'
-
-    if not os.path.exists(db_path):
-        print(f"Database file not found: {db_path}")
-        return
-
-    conn = sqlite3.connect(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute("PRAGMA table_info(images)")
-        cols = [r[1] for r in cur.fetchall()]
-        if 'phash' in cols:
-            print("Column 'phash' already exists on images")
-        else:
-            cur.execute("ALTER TABLE images ADD COLUMN phash TEXT")
-            print("Added 'phash' column on images")
-        conn.commit()
-    finally:
-        conn.close()
+    batch_migrate(['images'], ['phash'])
 
 
 if __name__ == '__main__':
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, func
+from sqlalchemy import Column, Integer, String, DateTime, Index, func, or_
 from backend.models.database import Base
 
 
@@ -11,6 +11,7 @@ class PurgedImage(Base):
     # File metadata fingerprint
     filename = Column(String, index=True)
     file_size = Column(Integer, index=True)
+    # compute_quick_hash fingerprint (32 hex chars); older rows hold a full SHA-256 (64)
     file_hash = Column(String(128), index=True)
     width = Column(Integer)
     height = Column(Integer)
@@ -22,6 +23,26 @@ class PurgedImage(Base):
     purged_at = Column(DateTime, server_default=func.now())
     purge_reason = Column(String, default="1-star rating")
     
+    __table_args__ = (
+        Index('ix_purged_images_filename_size', 'filename', 'file_size'),
+    )
+    
+    @classmethod
+    def is_purged(cls, session, filename: str = None, file_size: int = None, file_hash: str = None) -> bool:
+        """Check the blacklist with one indexed query: by filename and size (an entry
+        without a size matches any), and/or by file_hash, depending on what is given.
+        """
+        conditions = []
+        if filename is not None:
+            conditions.append(
+                (cls.filename == filename) & or_(cls.file_size.is_(None), cls.file_size == file_size)
+            )
+        if file_hash:
+            conditions.append(cls.file_hash == file_hash)
+        if not conditions:
+            return False
+        return session.query(cls.id).filter(or_(*conditions)).first() is not None
+    
     def matches_file(
         self,
         filename: str,
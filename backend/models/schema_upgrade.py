@@ -1,12 +1,68 @@
-from typing import Set
+import logging
+import os
+import tempfile
+import zlib
+from typing import Optional, Set
 from sqlalchemy.engine import Engine
-from sqlalchemy import text
+from sqlalchemy import MetaData, text
+
+logger = logging.getLogger(__name__)
+
+# Serializes schema setup between app processes booting on the same host
+SCHEMA_LOCK_PATH = os.getenv("SCHEMA_LOCK_PATH", os.path.join(tempfile.gettempdir(), "photo_library_schema.lock"))
+
+# Set once this process has confirmed (or brought) the schema up to date
+_SCHEMA_OK = False
+
+
+def init_schema(engine: Engine, metadata: MetaData) -> None:
+    """Create missing tables and run ensure_schema while holding an exclusive file lock,
+    so parallel workers don't introspect and ALTER the same database at once.
+    """
+    with open(SCHEMA_LOCK_PATH, "w") as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except ImportError:
+            pass  # no flock (Windows); fall back to unserialized setup
+        metadata.create_all(bind=engine)
+        ensure_schema(engine)
+
+
+def _schema_version(*specs) -> int:
+    """Stable positive 31-bit fingerprint of the DDL spec (fits SQLite's user_version)"""
+    return zlib.crc32(repr(specs).encode()) & 0x7FFFFFFF
+
+
+def _read_schema_version(conn, dialect: str) -> Optional[int]:
+    if dialect == "sqlite":
+        return conn.execute(text("PRAGMA user_version")).scalar()
+    try:
+        value = conn.execute(text("SELECT value FROM schema_meta WHERE key = 'schema_version'")).scalar()
+    except Exception:
+        conn.rollback()  # no schema_meta table yet
+        return None
+    return int(value) if value is not None else None
+
+
+def _stamp_schema_version(conn, dialect: str, version: int) -> None:
+    if dialect == "sqlite":
+        conn.execute(text(f"PRAGMA user_version = {version}"))
+        return
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_meta (key VARCHAR(64) PRIMARY KEY, value VARCHAR(255))"))
+    conn.execute(text("DELETE FROM schema_meta WHERE key = 'schema_version'"))
+    conn.execute(text("INSERT INTO schema_meta (key, value) VALUES ('schema_version', :v)"), {"v": str(version)})
 
 
 def ensure_schema(engine: Engine) -> None:
-    """Ensure required columns exist on images and categories tables.
-    Idempotent and safe for both PostgreSQL and SQLite.
+    """Ensure required columns and indexes exist on images, categories, jobs and ai_tag_cache tables.
+    Idempotent and safe for both PostgreSQL and SQLite. The database is stamped with a
+    fingerprint of the spec below, so once it is current this is a single version read.
     """
+    global _SCHEMA_OK
+    if _SCHEMA_OK:
+        return
+
     image_cols = {
         "local_path": "VARCHAR(255)",
         "aspect_ratio": "DOUBLE PRECISION",
@@ -26,27 +82,91 @@ def ensure_schema(engine: Engine) -> None:
     purged_cols = {
         "file_hash": "VARCHAR(128)"
     }
+    # Blacklist probe by name + size during scans
+    purged_indexes = [
+        "CREATE INDEX IF NOT EXISTS ix_purged_images_filename_size ON purged_images (filename, file_size)",
+    ]
+    job_cols = {
+        "updated_at": "TIMESTAMP",
+    }
+    # Partial indexes for the hot image counts (favorites on /stats) and the
+    # "no local copy yet" scan behind create-media-copies. The boolean literal
+    # differs per dialect, so the favorite predicate is filled in below.
+    image_indexes = [
+        "CREATE INDEX IF NOT EXISTS ix_images_local_path_null ON images (id) WHERE local_path IS NULL",
+        "CREATE INDEX IF NOT EXISTS ix_images_favorite_true ON images (id) WHERE favorite = {true}",
+    ]
+    ai_tag_cache_cols = {
+        "phash": "VARCHAR(64)",
+        "source_key": "VARCHAR(64)",
+    }
+    # Lookup by (model, path/size/mtime key) before any file is hashed
+    ai_tag_cache_indexes = [
+        "CREATE INDEX IF NOT EXISTS ix_ai_tag_cache_source_key ON ai_tag_cache (model_version, source_key)",
+    ]
+    # Indexes for the hot jobs predicates: active-job lookup per type, the
+    # newest-first listing, and the stalled running-job sweep. Partial indexes
+    # stay tiny because few jobs are ever pending/running.
+    job_indexes = [
+        "CREATE INDEX IF NOT EXISTS ix_jobs_active ON jobs (type) WHERE status IN ('pending', 'running')",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_created_at_desc ON jobs (created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS ix_jobs_stalled ON jobs (started_at) WHERE status = 'running'",
+    ]
+
+    category_cols = {
+        "featured_image_id": "INTEGER",
+        "featured_image_position": "TEXT",
+    }
+    version = _schema_version(
+        image_cols, purged_cols, job_cols, image_indexes, ai_tag_cache_cols, job_indexes, category_cols,
+        ai_tag_cache_indexes, purged_indexes,
+    )
 
     with engine.connect() as conn:
         dialect = engine.dialect.name
+        if _read_schema_version(conn, dialect) == version:
+            _SCHEMA_OK = True
+            return
 
+        upgraded = True
         if dialect == "postgresql":
-            for col, typ in image_cols.items():
-                try:
-                    conn.execute(text(f"ALTER TABLE images ADD COLUMN IF NOT EXISTS {col} {typ}"))
-                except Exception:
-                    pass
-            for col, typ in purged_cols.items():
-                try:
-                    conn.execute(text(f"ALTER TABLE purged_images ADD COLUMN IF NOT EXISTS {col} {typ}"))
-                except Exception:
-                    pass
+            # One ALTER TABLE per table with every column as an ADD COLUMN clause,
+            # sent as a single script. Indexes run one at a time afterwards so a
+            # failing index can't roll back the column migrations.
+            table_cols = {
+                "images": image_cols,
+                "purged_images": purged_cols,
+                "jobs": job_cols,
+                "ai_tag_cache": ai_tag_cache_cols,
+                "categories": category_cols,
+            }
+            column_script = "; ".join(
+                f"ALTER TABLE {table} " + ", ".join(
+                    f"ADD COLUMN IF NOT EXISTS {col} {typ}" for col, typ in cols.items()
+                )
+                for table, cols in table_cols.items()
+            )
             try:
-                conn.execute(text("ALTER TABLE categories ADD COLUMN IF NOT EXISTS featured_image_id INTEGER"))
-                conn.execute(text("ALTER TABLE categories ADD COLUMN IF NOT EXISTS featured_image_position TEXT"))
+                conn.exec_driver_sql(column_script)
+                conn.commit()
             except Exception:
-                pass
-            conn.commit()
+                conn.rollback()
+                logger.exception("Schema upgrade failed running: %s", column_script)
+                upgraded = False
+            index_statements = (
+                job_indexes
+                + [ddl.format(true="TRUE") for ddl in image_indexes]
+                + ai_tag_cache_indexes
+                + purged_indexes
+            )
+            for ddl in index_statements:
+                try:
+                    conn.exec_driver_sql(ddl)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    logger.exception("Schema upgrade failed running: %s", ddl)
+                    upgraded = False
         else:
             # SQLite: PRAGMA introspection and conditional ALTERs
             try:
@@ -63,13 +183,37 @@ def ensure_schema(engine: Engine) -> None:
                 for col, typ in purged_cols.items():
                     if col not in existing_purged:
                         conn.execute(text(f"ALTER TABLE purged_images ADD COLUMN {col} {typ}"))
+                for ddl in purged_indexes:
+                    conn.execute(text(ddl))
+                rows = conn.execute(text("PRAGMA table_info(jobs)")).fetchall()
+                existing_jobs = {r[1] for r in rows}
+                for col, typ in job_cols.items():
+                    if col not in existing_jobs:
+                        conn.execute(text(f"ALTER TABLE jobs ADD COLUMN {col} {typ}"))
+                for ddl in job_indexes:
+                    conn.execute(text(ddl))
+                for ddl in image_indexes:
+                    conn.execute(text(ddl.format(true="1")))
+                rows = conn.execute(text("PRAGMA table_info(ai_tag_cache)")).fetchall()
+                existing_cache = {r[1] for r in rows}
+                for col, typ in ai_tag_cache_cols.items():
+                    if col not in existing_cache:
+                        conn.execute(text(f"ALTER TABLE ai_tag_cache ADD COLUMN {col} {typ}"))
+                for ddl in ai_tag_cache_indexes:
+                    conn.execute(text(ddl))
                 # categories columns
                 rows = conn.execute(text("PRAGMA table_info(categories)")).fetchall()
                 existing_cat = {r[1] for r in rows}
-                if 'featured_image_id' not in existing_cat:
-                    conn.execute(text("ALTER TABLE categories ADD COLUMN featured_image_id INTEGER"))
-                if 'featured_image_position' not in existing_cat:
-                    conn.execute(text("ALTER TABLE categories ADD COLUMN featured_image_position TEXT"))
+                for col, typ in category_cols.items():
+                    if col not in existing_cat:
+                        conn.execute(text(f"ALTER TABLE categories ADD COLUMN {col} {typ}"))
             except Exception:
-                pass
+                logger.exception("SQLite schema upgrade failed")
+                upgraded = False
+            conn.commit()
+
+        # Only a fully applied spec is stamped; otherwise the next start retries
+        if upgraded:
+            _stamp_schema_version(conn, dialect, version)
             conn.commit()
+            _SCHEMA_OK = True
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, select
+from sqlalchemy.orm import relationship, column_property
 from sqlalchemy.sql import func
 from .database import Base
 from .image import image_tags
@@ -15,11 +15,23 @@ class Tag(Base):
     # Relationships
     images = relationship("Image", secondary=image_tags, back_populates="tags")
     
+    # Counted in SQL on first access instead of loading every related Image
+    image_count = column_property(
+        select(func.count(image_tags.c.image_id))
+        .where(image_tags.c.tag_id == id)
+        .correlate_except(image_tags)
+        .scalar_subquery(),
+        deferred=True,
+    )
+    
+    # Fetch server defaults (created_at) with the INSERT instead of a later SELECT
+    __mapper_args__ = {"eager_defaults": True}
+    
     def to_dict(self):
         return {
             "id": self.id,
             "name": self.name,
             "color": self.color,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "image_count": len(self.images)
+            "image_count": self.image_count or 0
         }
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Content-hash cache for AI tag suggestions.
+Results are stored per (file SHA-256, tagger model version), so re-running tagging
+over files that were already processed is a lookup instead of model inference.
+Each entry also remembers the path/size/mtime it was computed from, so an unchanged
+file is found without reading (hashing) it at all.
+For content-only taggers, a file whose hash misses can also reuse the tags of a
+near-duplicate (bursts, re-exports, light edits) found by perceptual hash.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from backend.models import AITagCache
+from backend.services.phash import BKTree, phash_from_path
+from backend.utils.file_fingerprint import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+# Max Hamming distance (of the 256-bit phash) for reusing a neighbour's tags; 0 disables
+PHASH_REUSE_MAX_DISTANCE = int(os.getenv("AI_TAG_PHASH_MAX_DISTANCE", "24"))
+
+# One in-memory BK-tree per model version, loaded from the cache table on first use
+_phash_indexes: Dict[str, BKTree] = {}
+_phash_lock = threading.Lock()
+
+
+def _phash_index(db: Session, model_version: str) -> BKTree:
+    with _phash_lock:
+        tree = _phash_indexes.get(model_version)
+        if tree is None:
+            tree = BKTree()
+            rows = db.query(AITagCache.phash, AITagCache.tags).filter(
+                AITagCache.model_version == model_version,
+                AITagCache.phash.isnot(None),
+            ).all()
+            for phash, tags in rows:
+                tree.add(phash, tags)
+            _phash_indexes[model_version] = tree
+        return tree
+
+
+def source_key(path: str) -> Optional[str]:
+    """Digest of path, size and mtime; changes whenever the file is replaced or edited"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    raw = f"{path}:{st.st_size}:{st.st_mtime_ns}".encode("utf-8", "surrogateescape")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def generate_tags_cached(db: Session, tagger, image_path: str) -> List[str]:
+    """Return cached tags for the file's content, running the tagger on a miss.
+    New results are added to the session and persisted with the caller's commit.
+    """
+    return generate_tags_cached_batch(db, tagger, [image_path])[0]
+
+
+def generate_tags_cached_batch(
+    db: Session,
+    tagger,
+    image_paths: List[str],
+    phashes: Optional[List[Optional[str]]] = None,
+) -> List[List[str]]:
+    """Batch form of generate_tags_cached: one cache query by source key and one by
+    content hash (only for the files not matched by key) for all paths, and a
+    single generate_tags_batch call for the misses. Known perceptual hashes can
+    be passed in phashes; missing ones are computed. Returns one tag list per path.
+    """
+    model_version = getattr(tagger, "model_version", type(tagger).__name__)
+    results: List[List[str]] = [[] for _ in image_paths]
+
+    # Unchanged files (same path, size and mtime) are answered without reading them
+    keys = [source_key(path) for path in image_paths]
+    by_key = {}
+    known_keys = {k for k in keys if k}
+    if known_keys:
+        rows = db.query(AITagCache.source_key, AITagCache.tags).filter(
+            AITagCache.model_version == model_version,
+            AITagCache.source_key.in_(known_keys),
+        ).all()
+        by_key = {key: tags for key, tags in rows}
+    pending = []
+    for idx, key in enumerate(keys):
+        if key in by_key:
+            results[idx] = list(by_key[key])
+        else:
+            pending.append(idx)
+    if not pending:
+        return results
+
+    hashes: List[Optional[str]] = [None] * len(image_paths)
+    for idx in pending:
+        hashes[idx] = compute_file_hash(image_paths[idx])
+
+    known = {hashes[idx] for idx in pending if hashes[idx]}
+    cached = {}
+    if known:
+        rows = db.query(AITagCache.file_hash, AITagCache.tags).filter(
+            AITagCache.model_version == model_version,
+            AITagCache.file_hash.in_(known),
+        ).all()
+        cached = {file_hash: tags for file_hash, tags in rows}
+
+    misses = []
+    for idx in pending:
+        file_hash = hashes[idx]
+        if file_hash in cached:
+            results[idx] = list(cached[file_hash])
+            # Moved or touched file with known content: point the entry at it
+            if keys[idx]:
+                db.query(AITagCache).filter(
+                    AITagCache.file_hash == file_hash,
+                    AITagCache.model_version == model_version,
+                ).update({AITagCache.source_key: keys[idx]}, synchronize_session=False)
+        else:
+            misses.append(idx)
+    if not misses:
+        return results
+
+    # Near-duplicates of already tagged files take their neighbour's tags
+    to_infer = misses
+    miss_phashes: Dict[int, Optional[str]] = {}
+    tree = None
+    if PHASH_REUSE_MAX_DISTANCE > 0 and getattr(tagger, "near_duplicate_reuse", False):
+        tree = _phash_index(db, model_version)
+        to_infer = []
+        for idx in misses:
+            phash = (phashes[idx] if phashes else None) or phash_from_path(image_paths[idx])
+            miss_phashes[idx] = phash
+            neighbour = tree.nearest(phash, PHASH_REUSE_MAX_DISTANCE) if phash else None
+            if neighbour:
+                logger.debug(f"AI tag near-duplicate hit for {image_paths[idx]}")
+                results[idx] = list(neighbour)
+            else:
+                to_infer.append(idx)
+
+    if to_infer:
+        # Copies within the batch (same content, or same phash when reuse is on)
+        # are inferred once and share the result
+        first_seen: Dict[tuple, int] = {}
+        duplicate_of: Dict[int, int] = {}
+        for idx in to_infer:
+            phash = miss_phashes.get(idx)
+            key = ("phash", phash) if phash else ("hash", hashes[idx] or idx)
+            source = first_seen.setdefault(key, idx)
+            if source != idx:
+                duplicate_of[idx] = source
+        unique = [idx for idx in to_infer if idx not in duplicate_of]
+
+        generated = tagger.generate_tags_batch([image_paths[idx] for idx in unique])
+        for idx, tags in zip(unique, generated):
+            results[idx] = tags
+            if tree is not None and tags and miss_phashes.get(idx):
+                tree.add(miss_phashes[idx], tags)
+        for idx, source in duplicate_of.items():
+            results[idx] = list(results[source])
+
+    stored = set()
+    for idx in misses:
+        tags = results[idx]
+        file_hash = hashes[idx]
+        if tags and file_hash and file_hash not in stored:
+            db.merge(AITagCache(
+                file_hash=file_hash, model_version=model_version, tags=tags,
+                phash=miss_phashes.get(idx), source_key=keys[idx],
+            ))
+            stored.add(file_hash)
+    return results
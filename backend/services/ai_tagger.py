@@ -3,9 +3,12 @@ AI-powered automatic tagging service for images.
 Uses BLIP-2 for image captioning and extracts meaningful tags.
 """
 
+import functools
 import os
 import re
-from typing import List, Set, Optional, Dict, Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Set, Optional, Dict, Any, Iterator, Tuple
 from PIL import Image
 import torch
 from transformers import Blip2Processor, Blip2ForConditionalGeneration
@@ -13,44 +16,81 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Images captioned per model.generate call when tagging in batches
+INFERENCE_BATCH_SIZE = int(os.getenv("AI_TAGGER_BATCH_SIZE", "8"))
+# Larger batch used when the model runs on CUDA, where bigger batches keep the GPU busy
+CUDA_INFERENCE_BATCH_SIZE = int(os.getenv("AI_TAGGER_CUDA_BATCH_SIZE", "16"))
+# Threads decoding the next batch's images while the current batch is in generate
+DECODE_WORKERS = int(os.getenv("AI_TAGGER_DECODE_WORKERS", str(min(8, os.cpu_count() or 1))))
+# JPEGs are decoded at the smallest libjpeg scale that stays at least this large;
+# the processor resizes to 224x224 anyway
+CAPTION_DECODE_SIZE = (448, 448)
+
+# Weight precision on CUDA: "auto" (bf16 where supported, else fp16), "fp16", "bf16" or
+# "int8" (needs bitsandbytes). The CPU always runs fp32.
+AI_TAGGER_QUANT = os.getenv("AI_TAGGER_QUANT", "auto").lower()
+# Compile the vision encoder and language model forwards with torch.compile on CUDA.
+# Off by default: the first batches pay the compile time.
+AI_TAGGER_COMPILE = os.getenv("AI_TAGGER_COMPILE", "false").lower() == "true"
+# Let accelerate place/offload layers (device_map="auto") on CUDA instead of putting the
+# whole model on the GPU; only for GPUs too small to hold it
+AI_TAGGER_OFFLOAD = os.getenv("AI_TAGGER_OFFLOAD", "false").lower() in ("1", "true")
+
+# Words of three or more letters in a lowercased caption
+_WORD_RE = re.compile(r'\b[a-z]{3,}\b')
+
+# Common words to filter out from tags
+_STOPWORDS = frozenset({
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
+    'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+    'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these',
+    'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him',
+    'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our',
+    'their', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of',
+    'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
+    'before', 'after', 'above', 'below', 'between', 'among', 'very',
+    'really', 'quite', 'just', 'also', 'only', 'even', 'still', 'image',
+    'picture', 'photo', 'photograph', 'showing', 'depicts', 'features'
+})
+
+# Art and style specific keywords to prioritize
+_ART_KEYWORDS = frozenset({
+    'painting', 'drawing', 'sketch', 'artwork', 'illustration', 'digital',
+    'watercolor', 'oil', 'acrylic', 'pencil', 'ink', 'charcoal', 'pastel',
+    'portrait', 'landscape', 'abstract', 'realistic', 'stylized', 'anime',
+    'manga', 'cartoon', 'comic', 'fantasy', 'sci-fi', 'medieval', 'modern',
+    'vintage', 'retro', 'futuristic', 'surreal', 'impressionist', 'cubist'
+})
+
 
 class AITagger:
     """AI-powered image tagging service using BLIP-2"""
     
+    MODEL_NAME = "Salesforce/blip2-opt-2.7b-coco"  # Smaller, faster variant
+    # Identifies this tagger's output in the AI tag cache; bump when tag extraction changes
+    model_version = f"blip2:{MODEL_NAME}:1"
+    # Tags come from image content only, so near-duplicate images may share them
+    near_duplicate_reuse = True
+    
     def __init__(self):
         self.processor = None
         self.model = None
         self.device = None
+        self.dtype = torch.float32
         self._initialized = False
-        
-        # Common words to filter out from tags
-        self.stopwords = {
-            'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
-            'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-            'should', 'may', 'might', 'must', 'can', 'this', 'that', 'these', 
-            'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him',
-            'her', 'us', 'them', 'my', 'your', 'his', 'her', 'its', 'our', 
-            'their', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of',
-            'with', 'by', 'from', 'up', 'about', 'into', 'through', 'during',
-            'before', 'after', 'above', 'below', 'between', 'among', 'very',
-            'really', 'quite', 'just', 'also', 'only', 'even', 'still', 'image',
-            'picture', 'photo', 'photograph', 'showing', 'depicts', 'features'
-        }
-        
-        # Art and style specific keywords to prioritize
-        self.art_keywords = {
-            'painting', 'drawing', 'sketch', 'artwork', 'illustration', 'digital',
-            'watercolor', 'oil', 'acrylic', 'pencil', 'ink', 'charcoal', 'pastel',
-            'portrait', 'landscape', 'abstract', 'realistic', 'stylized', 'anime',
-            'manga', 'cartoon', 'comic', 'fantasy', 'sci-fi', 'medieval', 'modern',
-            'vintage', 'retro', 'futuristic', 'surreal', 'impressionist', 'cubist'
-        }
+        # Serializes model loading so concurrent requests don't load it twice
+        self._init_lock = threading.Lock()
 
     def initialize(self) -> bool:
         """Initialize the AI model. Returns True if successful."""
         if self._initialized:
             return True
-            
+        with self._init_lock:
+            if self._initialized:
+                return True
+            return self._load_model()
+
+    def _load_model(self) -> bool:
         try:
             logger.info("Initializing BLIP-2 model for AI tagging...")
             
@@ -59,17 +99,18 @@ class AITagger:
             logger.info(f"Using device: {self.device}")
             
             # Use smaller model for NAS optimization
-            model_name = "Salesforce/blip2-opt-2.7b-coco"  # Smaller, faster variant
+            model_name = self.MODEL_NAME
             self.processor = Blip2Processor.from_pretrained(model_name)
-            self.model = Blip2ForConditionalGeneration.from_pretrained(
-                model_name,
-                torch_dtype=torch.float32,  # Use float32 for CPU stability
-                low_cpu_mem_usage=True,     # Optimize memory usage
-                device_map="auto" if self.device == "cuda" else None
-            )
+            self.model = self._load_weights(model_name)
             
-            if self.device == "cpu":
+            # One explicit placement, unless accelerate already dispatched the
+            # model (int8 or AI_TAGGER_OFFLOAD)
+            if not getattr(self.model, "hf_device_map", None):
                 self.model = self.model.to(self.device)
+            self.model.eval()
+            self.model.language_model.config.use_cache = True
+            if self.device == "cuda" and AI_TAGGER_COMPILE:
+                self._compile_model()
                 
             self._initialized = True
             logger.info("BLIP-2 model initialized successfully")
@@ -79,44 +120,80 @@ class AITagger:
             logger.error(f"Failed to initialize AI tagging model: {e}")
             return False
 
+    def _cuda_dtype(self):
+        if AI_TAGGER_QUANT == "fp16":
+            return torch.float16
+        if AI_TAGGER_QUANT == "bf16" or torch.cuda.is_bf16_supported():
+            return torch.bfloat16
+        return torch.float16
+
+    def _load_weights(self, model_name: str):
+        """Load BLIP-2 in fp32 on CPU, or half precision / int8 on CUDA"""
+        if self.device != "cuda":
+            self.dtype = torch.float32  # Use float32 for CPU stability
+            return Blip2ForConditionalGeneration.from_pretrained(
+                model_name, torch_dtype=self.dtype, low_cpu_mem_usage=True
+            )
+
+        if AI_TAGGER_QUANT == "int8":
+            try:
+                from transformers import BitsAndBytesConfig
+                self.dtype = torch.float16  # non-quantized modules and inputs
+                model = Blip2ForConditionalGeneration.from_pretrained(
+                    model_name,
+                    torch_dtype=self.dtype,
+                    quantization_config=BitsAndBytesConfig(load_in_8bit=True),
+                    device_map="auto",
+                )
+                logger.info("Loaded BLIP-2 with int8 weights")
+                return model
+            except Exception as e:
+                logger.warning(f"int8 loading unavailable ({e}), using half precision")
+
+        self.dtype = self._cuda_dtype()
+        logger.info(f"Loading BLIP-2 in {self.dtype}")
+        return Blip2ForConditionalGeneration.from_pretrained(
+            model_name,
+            torch_dtype=self.dtype,
+            low_cpu_mem_usage=True,
+            device_map="auto" if AI_TAGGER_OFFLOAD else None,
+        )
+
+    def _compile_model(self) -> None:
+        """Replace the vision encoder and decoder forwards with torch.compile'd ones.
+        generate() calls the submodules directly, so wrapping the top-level
+        module would never be hit.
+        """
+        if not hasattr(torch, "compile"):
+            return
+        try:
+            vision, language = self.model.vision_model, self.model.language_model
+            vision.forward = torch.compile(vision.forward, mode="reduce-overhead")
+            # Sequence length grows every decoding step
+            language.forward = torch.compile(language.forward, dynamic=True)
+            logger.info("Compiled BLIP-2 forwards with torch.compile")
+        except Exception as e:
+            logger.warning(f"torch.compile unavailable, running eager: {e}")
+
     def extract_tags_from_caption(self, caption: str) -> List[str]:
         """Extract meaningful tags from an image caption"""
         if not caption:
             return []
             
-        # Clean and normalize the caption
-        caption = caption.lower().strip()
-        
-        # Remove punctuation and split into words
-        words = re.findall(r'\b[a-zA-Z]+\b', caption)
-        
-        # Filter out stopwords and short words
-        meaningful_words = [
-            word for word in words 
-            if word not in self.stopwords and len(word) > 2
-        ]
-        
-        # Prioritize art-related keywords
-        tags = []
+        # One pass over the words of 3+ letters: drop stopwords, and put
+        # art-related keywords first
         art_tags = []
-        
-        for word in meaningful_words:
-            if word in self.art_keywords:
+        tags = []
+        for word in _WORD_RE.findall(caption.lower()):
+            if word in _STOPWORDS:
+                continue
+            if word in _ART_KEYWORDS:
                 art_tags.append(word)
             else:
                 tags.append(word)
-                
-        # Combine with art tags first
-        final_tags = art_tags + tags
-        
+
         # Remove duplicates while preserving order
-        seen = set()
-        unique_tags = []
-        for tag in final_tags:
-            if tag not in seen:
-                seen.add(tag)
-                unique_tags.append(tag)
-                
+        unique_tags = list(dict.fromkeys(art_tags + tags))
         return unique_tags[:10]  # Limit to top 10 tags
 
     def generate_caption(self, image_path: str) -> Optional[str]:
@@ -127,10 +204,10 @@ class AITagger:
                 
         try:
             # Load and process the image
-            image = Image.open(image_path).convert('RGB')
+            image = self._decode_for_caption(image_path)
             
             # Process the image with proper padding
-            inputs = self.processor(image, return_tensors="pt", padding=True).to(self.device)
+            inputs = self.processor(image, return_tensors="pt", padding=True).to(self.device, self.dtype)
             
             # Generate caption with NAS optimization
             with torch.no_grad():
@@ -149,6 +226,131 @@ class AITagger:
             logger.error(f"Failed to generate caption for {image_path}: {e}")
             return None
 
+    @staticmethod
+    def _decode_for_caption(image_path: str):
+        """Open an image as RGB, letting libjpeg downscale JPEGs while decoding
+        (draft() is a no-op for other formats)
+        """
+        image = Image.open(image_path)
+        image.draft('RGB', CAPTION_DECODE_SIZE)
+        return image.convert('RGB')
+
+    @classmethod
+    def _load_image(cls, image_path: str):
+        """Decode an image for captioning, or None if it can't be read"""
+        try:
+            return cls._decode_for_caption(image_path)
+        except Exception as e:
+            logger.error(f"Failed to load {image_path} for captioning: {e}")
+            return None
+
+    def generate_captions(self, image_paths: List[str], images: Optional[List[Any]] = None) -> List[Optional[str]]:
+        """Generate captions for several images with one batched forward pass.
+        Already decoded images (None for unreadable ones) can be passed in images.
+        Returns one caption (or None on failure) per path, in order.
+        """
+        captions: List[Optional[str]] = [None] * len(image_paths)
+        if not image_paths:
+            return captions
+        if not self._initialized:
+            if not self.initialize():
+                return captions
+
+        if images is None:
+            images = [self._load_image(image_path) for image_path in image_paths]
+        loaded = [idx for idx, image in enumerate(images) if image is not None]
+        if not loaded:
+            return captions
+
+        try:
+            inputs = self.processor(images=[images[idx] for idx in loaded], return_tensors="pt")
+            if self.device == "cuda":
+                # Pinned host memory lets the copy to the GPU run asynchronously
+                inputs["pixel_values"] = inputs["pixel_values"].pin_memory()
+            inputs = inputs.to(self.device, self.dtype, non_blocking=self.device == "cuda")
+            with torch.no_grad():
+                generated_ids = self.model.generate(
+                    **inputs,
+                    max_length=30,
+                    num_beams=2,
+                    early_stopping=True,
+                    do_sample=False
+                )
+            decoded = self.processor.batch_decode(generated_ids, skip_special_tokens=True)
+            for idx, caption in zip(loaded, decoded):
+                captions[idx] = caption.strip()
+        except Exception as e:
+            logger.error(f"Batched caption generation failed for {len(loaded)} images: {e}")
+        return captions
+
+    @property
+    def batch_size(self) -> int:
+        """Images per model.generate call on the current device"""
+        return CUDA_INFERENCE_BATCH_SIZE if self.device == "cuda" else INFERENCE_BATCH_SIZE
+
+    def _iter_tags(self, image_paths: List[str]) -> Iterator[Tuple[int, List[str]]]:
+        """Yield (index, tags) for each path as its tags are settled (not in input
+        order), captioning in batches of batch_size. The next batch is decoded on
+        DECODE_WORKERS threads while the current one is in model.generate. Same
+        per-image fallbacks as generate_tags.
+        """
+        to_caption = []
+        for idx, image_path in enumerate(image_paths):
+            try:
+                if not os.path.exists(image_path):
+                    logger.warning(f"Image file not found: {image_path}")
+                    yield idx, []
+                    continue
+                if os.path.getsize(image_path) > 50 * 1024 * 1024:  # > 50MB, use lite mode
+                    yield idx, self._fallback_to_lite_mode(image_path)
+                    continue
+                to_caption.append(idx)
+            except Exception as e:
+                logger.error(f"Failed to inspect {image_path}: {e}")
+                yield idx, []
+        if not to_caption:
+            return
+
+        if not self._initialized:
+            self.initialize()
+        batch_size = self.batch_size
+        batches = [to_caption[start:start + batch_size] for start in range(0, len(to_caption), batch_size)]
+
+        with ThreadPoolExecutor(max_workers=max(1, DECODE_WORKERS)) as pool:
+            def prefetch(indices: List[int]) -> List[Future]:
+                return [pool.submit(self._load_image, image_paths[idx]) for idx in indices]
+
+            pending = prefetch(batches[0])
+            for n, indices in enumerate(batches):
+                images = [future.result() for future in pending]
+                if n + 1 < len(batches):
+                    pending = prefetch(batches[n + 1])
+                captions = self.generate_captions([image_paths[idx] for idx in indices], images)
+                for idx, caption in zip(indices, captions):
+                    if caption:
+                        yield idx, self.extract_tags_from_caption(caption)
+                    else:
+                        yield idx, self._fallback_to_lite_mode(image_paths[idx])
+
+    def iter_generate_tags(self, image_paths: List[str],
+                           progress_callback: Optional[callable] = None) -> Iterator[Tuple[str, List[str]]]:
+        """Stream (path, tags) pairs as they are generated, so callers can write them
+        out in batches instead of holding every result. progress_callback(done,
+        total, path) is called before each pair is yielded.
+        """
+        total = len(image_paths)
+        for done, (idx, tags) in enumerate(self._iter_tags(image_paths), start=1):
+            if progress_callback:
+                progress_callback(done, total, image_paths[idx])
+            yield image_paths[idx], tags
+
+    def generate_tags_batch(self, image_paths: List[str]) -> List[List[str]]:
+        """Generate tags for several images; one tag list per path, in order"""
+        results: List[List[str]] = [[] for _ in image_paths]
+        for idx, tags in self._iter_tags(image_paths):
+            results[idx] = tags
+        return results
+
     def generate_tags(self, image_path: str) -> List[str]:
         """Generate tags for an image with fallback to lite mode"""
         if not os.path.exists(image_path):
@@ -190,42 +392,43 @@ class AITagger:
 
     def batch_generate_tags(self, image_paths: List[str], 
                           progress_callback: Optional[callable] = None) -> Dict[str, List[str]]:
-        """Generate tags for multiple images with progress tracking"""
+        """Generate tags for multiple images with progress tracking.
+        Collects iter_generate_tags; prefer that for large sets.
+        """
         results = {}
-        total = len(image_paths)
-        
-        for i, image_path in enumerate(image_paths):
-            try:
-                tags = self.generate_tags(image_path)
-                results[image_path] = tags
-                
-                if progress_callback:
-                    progress_callback(i + 1, total, image_path)
-                    
-            except Exception as e:
-                logger.error(f"Failed to process {image_path}: {e}")
-                results[image_path] = []
-                
+        try:
+            results.update(self.iter_generate_tags(image_paths, progress_callback))
+        except Exception as e:
+            logger.error(f"Failed to process {len(image_paths)} images: {e}")
+        for image_path in image_paths:
+            results.setdefault(image_path, [])
         return results
 
     def cleanup(self):
-        """Clean up model resources"""
-        if self.model:
-            del self.model
-        if self.processor:
-            del self.processor
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-        self._initialized = False
+        """Clean up model resources and hand GPU memory back right away"""
+        import gc
+        with self._init_lock:
+            self._initialized = False
+            # Just drop the references: moving a multi-GB model to CPU first only
+            # adds a copy (and fails for int8/offloaded models)
+            self.model = None
+            self.processor = None
+            # Break reference cycles (module hooks) now instead of at the next GC pass
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+                torch.cuda.ipc_collect()
         logger.info("AI tagger resources cleaned up")
 
 
 # Global instance
 _ai_tagger = None
 
-def get_ai_tagger():
-    """Get the appropriate AI tagger instance based on environment"""
-    import os
+@functools.lru_cache(maxsize=1)
+def _choose_tagger_mode() -> str:
+    """Decide once per process between "lite" and "full"; RAM, CUDA and the
+    environment don't change while it runs
+    """
     import psutil
     
     # Check if running in lite mode (for NAS or low-resource environments)
@@ -245,13 +448,8 @@ def get_ai_tagger():
             
             # Check if CUDA is available
             if not use_lite_mode:
-                try:
-                    import torch
-                    if not torch.cuda.is_available():
-                        logger.info("No CUDA detected, using lite mode for CPU optimization")
-                        use_lite_mode = True
-                except ImportError:
-                    logger.info("PyTorch not available, using lite mode")
+                if not torch.cuda.is_available():
+                    logger.info("No CUDA detected, using lite mode for CPU optimization")
                     use_lite_mode = True
                     
         except Exception as e:
@@ -260,11 +458,27 @@ def get_ai_tagger():
     
     if use_lite_mode:
         logger.info("Using lightweight AI tagger")
+        return "lite"
+    logger.info("Using full AI tagger with BLIP-2")
+    return "full"
+
+
+def get_ai_tagger():
+    """Get the appropriate AI tagger instance based on environment"""
+    if _choose_tagger_mode() == "lite":
         from .ai_tagger_lite import get_ai_tagger_lite
         return get_ai_tagger_lite()
     
-    logger.info("Using full AI tagger with BLIP-2")
     global _ai_tagger
     if _ai_tagger is None:
         _ai_tagger = AITagger()
-    return _ai_tagger
\ No newline at end of file
+    return _ai_tagger
+
+
+def preload_ai_tagger() -> bool:
+    """Load the selected tagger's model once so requests and jobs find it warm"""
+    tagger = get_ai_tagger()
+    ok = tagger.initialize()
+    if not ok:
+        logger.warning("AI tagger preload failed; it will be retried on first use")
+    return ok
@@ -5,15 +5,26 @@ Uses smaller models suitable for NAS devices.
 
 import os
 import re
-from typing import List, Set, Optional, Dict
+from typing import List, Set, Optional, Dict, Iterator, Tuple
 from PIL import Image
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Filename separators, replaced with spaces before splitting into words
+_SEP_RE = re.compile(r'[_\-\.]')
+# Whole words of 3+ letters (a run glued to digits, like "img001", is not a word)
+_WORD_RE = re.compile(r'\b[a-zA-Z]{3,}\b')
+
+
 class AITaggerLite:
     """Lightweight AI tagger for NAS devices"""
     
+    # Identifies this tagger's output in the AI tag cache; bump when the rules change
+    model_version = "lite:1"
+    # Tags depend on the filename, so near-duplicates can't borrow each other's
+    near_duplicate_reuse = False
+    
     def __init__(self):
         self._initialized = False
         
@@ -56,6 +67,24 @@ class AITaggerLite:
             'happy', 'sad', 'angry', 'peaceful', 'energetic', 'calm', 'exciting',
             'mysterious', 'romantic', 'epic', 'heroic', 'villainous', 'cute', 'scary'
         }
+        
+        # Filename words that mean "artwork" when they aren't a category tag themselves
+        self._artwork_synonyms = frozenset({'art', 'artwork', 'drawing', 'painting', 'sketch'})
+        
+        # word -> tag for every recognised filename word, so matching is one lookup
+        # per word; category words map to themselves and take precedence
+        self._word_to_tag = {word: 'artwork' for word in self._artwork_synonyms}
+        for category in (self.mood_tags, self.character_tags, self.color_tags,
+                         self.technique_tags, self.subject_tags, self.style_tags):
+            self._word_to_tag.update((word, word) for word in category)
+        
+        # Compound phrases in the cleaned filename (any of the alternatives) and
+        # the tags they add
+        self._phrase_tags = (
+            (('black widow',), ('black_widow',)),
+            (('beach day',), ('beach', 'day')),
+            (('scarlett johansson', 'natasha romanoff'), ('scarlett_johansson', 'black_widow', 'character')),
+        )
 
     def initialize(self) -> bool:
         """Initialize the lightweight tagger"""
@@ -110,36 +139,22 @@ class AITaggerLite:
         name = os.path.splitext(filename)[0].lower()
         
         # Replace common separators with spaces
-        name = re.sub(r'[_\-\.]', ' ', name)
+        name = _SEP_RE.sub(' ', name)
         
         # Extract words
-        words = re.findall(r'\b[a-zA-Z]{3,}\b', name)
+        words = _WORD_RE.findall(name)
         
         # Match against all known categories
+        word_to_tag = self._word_to_tag
         for word in words:
-            if word in self.style_tags:
-                tags.append(word)
-            elif word in self.subject_tags:
-                tags.append(word)
-            elif word in self.technique_tags:
-                tags.append(word)
-            elif word in self.color_tags:
-                tags.append(word)
-            elif word in self.character_tags:
-                tags.append(word)
-            elif word in self.mood_tags:
-                tags.append(word)
-            elif word in ['art', 'artwork', 'drawing', 'painting', 'sketch']:
-                tags.append('artwork')
+            tag = word_to_tag.get(word)
+            if tag:
+                tags.append(tag)
         
         # Special pattern matching for compound terms
-        name_lower = name.lower()
-        if 'black widow' in name_lower:
-            tags.append('black_widow')
-        if 'beach day' in name_lower:
-            tags.extend(['beach', 'day'])
-        if any(term in name_lower for term in ['scarlett johansson', 'natasha romanoff']):
-            tags.extend(['scarlett_johansson', 'black_widow', 'character'])
+        for phrases, phrase_tags in self._phrase_tags:
+            if any(phrase in name for phrase in phrases):
+                tags.extend(phrase_tags)
         
         return tags
 
@@ -210,25 +225,30 @@ class AITaggerLite:
             logger.error(f"Failed to generate tags for {image_path}: {e}")
             return []
 
+    def generate_tags_batch(self, image_paths: List[str]) -> List[List[str]]:
+        """Generate tags for several images; one tag list per path, in order"""
+        return [self.generate_tags(image_path) for image_path in image_paths]
+
     def batch_generate_tags(self, image_paths: List[str], 
                           progress_callback: Optional[callable] = None) -> Dict[str, List[str]]:
         """Generate tags for multiple images"""
-        results = {}
+        return dict(self.iter_generate_tags(image_paths, progress_callback))
+
+    def iter_generate_tags(self, image_paths: List[str],
+                           progress_callback: Optional[callable] = None) -> Iterator[Tuple[str, List[str]]]:
+        """Stream (path, tags) pairs, one image at a time"""
         total = len(image_paths)
         
         for i, image_path in enumerate(image_paths):
             try:
                 tags = self.generate_tags(image_path)
-                results[image_path] = tags
-                
-                if progress_callback:
-                    progress_callback(i + 1, total, image_path)
-                    
             except Exception as e:
                 logger.error(f"Failed to process {image_path}: {e}")
-                results[image_path] = []
+                tags = []
                 
-        return results
+            if progress_callback:
+                progress_callback(i + 1, total, image_path)
+            yield image_path, tags
 
     def cleanup(self):
         """Clean up resources"""
@@ -1,10 +1,11 @@
 import os
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
 
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from backend.models import Image, PurgedImage
-from backend.utils.file_fingerprint import compute_file_hash
+from backend.utils.file_fingerprint import FULL_HASH_LENGTH, compute_quick_hash
 from backend.utils.path_utils import get_container_path
 
 
@@ -45,7 +46,7 @@ def collect_blacklist_fingerprint(image: Image) -> Dict[str, Optional[object]]:
         file_size = os.path.getsize(path)
       except Exception:
         pass
-    file_hash = compute_file_hash(path)
+    file_hash = compute_quick_hash(path)
     if file_hash:
       break
 
@@ -55,15 +56,71 @@ def collect_blacklist_fingerprint(image: Image) -> Dict[str, Optional[object]]:
   }
 
 
-def add_blacklist_entry(db: Session, image: Image, reason: str) -> None:
+def _blacklist_values(image: Image, reason: str) -> Dict[str, Optional[object]]:
   fingerprint = collect_blacklist_fingerprint(image)
-  entry = PurgedImage(
-    filename=image.filename,
-    file_size=fingerprint.get('file_size'),
-    file_hash=fingerprint.get('file_hash'),
-    width=image.width,
-    height=image.height,
-    original_path=image.path,
-    purge_reason=reason,
-  )
-  db.add(entry)
+  return {
+    'filename': image.filename,
+    'file_size': fingerprint.get('file_size'),
+    'file_hash': fingerprint.get('file_hash'),
+    'width': image.width,
+    'height': image.height,
+    'original_path': image.path,
+    'purge_reason': reason,
+  }
+
+
+def add_blacklist_entry(db: Session, image: Image, reason: str) -> None:
+  db.add(PurgedImage(**_blacklist_values(image, reason)))
+
+
+def add_blacklist_entries(
+  db: Session,
+  images: Iterable[Image],
+  reason_fn: Callable[[Image], str],
+) -> int:
+  """Blacklist many images with a single multi-row INSERT.
+
+  ``reason_fn`` maps each image to its purge reason. Returns the number of
+  rows inserted.
+  """
+  values = [_blacklist_values(image, reason_fn(image)) for image in images]
+  if values:
+    db.execute(insert(PurgedImage), values)
+  return len(values)
+
+
+class PurgedSnapshot:
+  """In-memory copy of the blacklist keys, loaded with one query per scan.
+
+  Lets the scanner answer blacklist checks for every file without a query
+  per file, and skip hashing when no entry could match a hash. Entries
+  purged after the snapshot was taken are seen by the next scan.
+  """
+
+  def __init__(self, db: Session):
+    self.names_any_size: Set[str] = set()
+    self.name_sizes: Set[Tuple[str, int]] = set()
+    self.hashes: Set[str] = set()
+    self.legacy_hash_sizes: Set[Optional[int]] = set()
+    rows = db.query(PurgedImage.filename, PurgedImage.file_size, PurgedImage.file_hash)
+    for filename, file_size, file_hash in rows:
+      if filename is not None:
+        if file_size is None:
+          self.names_any_size.add(filename)
+        else:
+          self.name_sizes.add((filename, file_size))
+      if file_hash:
+        self.hashes.add(file_hash)
+        if len(file_hash) == FULL_HASH_LENGTH:
+          self.legacy_hash_sizes.add(file_size)
+
+  def matches_name(self, filename: str, file_size: int) -> bool:
+    """Same rule as PurgedImage.is_purged: name and size, or name of an entry without a size"""
+    return filename in self.names_any_size or (filename, file_size) in self.name_sizes
+
+  def matches_hash(self, file_hash: Optional[str]) -> bool:
+    return bool(file_hash) and file_hash in self.hashes
+
+  def has_legacy_hash(self, file_size: int) -> bool:
+    """Whether an older full SHA-256 entry could match a file of this size"""
+    return file_size in self.legacy_hash_sizes
@@ -4,13 +4,15 @@ import re
 from datetime import datetime
 from typing import List, Set, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy import func
 
-from backend.models import Image, Job, Category, PurgedImage
+from backend.models import Image, Job, Category
 from backend.services.metadata_extractor import MetadataExtractor
 from backend.services.thumbnail_generator import ThumbnailGenerator
 from backend.services.media_manager import MediaManager
-from backend.utils.file_fingerprint import compute_file_hash
+from backend.services.blacklist import PurgedSnapshot
+from backend.utils.file_fingerprint import compute_file_hash, compute_quick_hash
+from backend.utils.path_utils import clear_serving_path_cache
 
 
 class ImageScanner:
@@ -57,6 +59,9 @@ class ImageScanner:
                 job.total_items = len(all_image_paths)
                 db.commit()
             
+            # Blacklist keys are read once for the whole scan
+            purged = PurgedSnapshot(db)
+            
             # Process each image
             processed_count = 0
             added_count = 0
@@ -64,7 +69,7 @@ class ImageScanner:
             
             for image_path in all_image_paths:
                 try:
-                    result = self._process_image(db, image_path)
+                    result = self._process_image(db, image_path, purged)
                     if result == 'added':
                         added_count += 1
                     elif result == 'updated':
@@ -90,6 +95,8 @@ class ImageScanner:
             except Exception:
                 # Non-fatal; continue job completion
                 pass
+            # Files may have moved or disappeared; re-resolve serving paths on demand
+            clear_serving_path_cache()
             
             if job_id:
                 job.status = 'completed'
@@ -130,8 +137,20 @@ class ImageScanner:
         
         return image_paths
     
-    def _process_image(self, db: Session, image_path: str) -> str:
-        """Process a single image file"""
+    def _is_blacklisted_snapshot(self, purged: PurgedSnapshot, image_path: str, filename: str, file_size: int) -> bool:
+        """Blacklist check against a scan snapshot; files are only hashed when
+        some entry could match the hash
+        """
+        if purged.matches_name(filename, file_size):
+            return True
+        if purged.hashes and purged.matches_hash(compute_quick_hash(image_path)):
+            return True
+        if purged.has_legacy_hash(file_size):
+            return purged.matches_hash(compute_file_hash(image_path))
+        return False
+    
+    def _process_image(self, db: Session, image_path: str, purged: PurgedSnapshot) -> str:
+        """Process a single image file, checking new files against the scan's blacklist snapshot"""
         # Check if image already exists in database
         existing_image = db.query(Image).filter(Image.path == image_path).first()
         
@@ -144,22 +163,9 @@ class ImageScanner:
             return 'error'
         
         # Check if this file is blacklisted (only for new images)
-        file_hash = None
         if not existing_image:
             filename = os.path.basename(image_path)
-            blacklisted = db.query(PurgedImage).filter(
-                PurgedImage.filename == filename,
-                or_(PurgedImage.file_size == None, PurgedImage.file_size == file_size)
-            ).first()
-
-            if not blacklisted:
-                try:
-                    file_hash = compute_file_hash(image_path)
-                except Exception:
-                    file_hash = None
-                if file_hash:
-                    blacklisted = db.query(PurgedImage).filter(PurgedImage.file_hash == file_hash).first()
-
+            blacklisted = self._is_blacklisted_snapshot(purged, image_path, filename, file_size)
             if blacklisted:
                 print(f"Skipping blacklisted file: {image_path}")
                 return 'blacklisted'
@@ -386,6 +392,7 @@ class ImageScanner:
             # Commit all deletions
             if orphaned_count > 0:
                 db.commit()
+                clear_serving_path_cache()
             
             # Update job completion
             if job_id:
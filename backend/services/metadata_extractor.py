@@ -14,6 +14,24 @@ class MetadataExtractor:
     
     def __init__(self):
         self.supported_formats = {'.png', '.jpg', '.jpeg', '.webp', '.tiff', '.tif', '.cr2', '.nef', '.arw', '.dng'}
+        # libmagic handle, opened once and reused for every file this extractor sees
+        self._magic = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def close(self):
+        """Release the libmagic handle"""
+        self._magic = None
+
+    def _mime_type(self, file_path: str) -> str:
+        if self._magic is None:
+            self._magic = magic.Magic(mime=True)
+        return self._magic.from_file(file_path)
     
     def extract_metadata(self, file_path: str) -> Dict[str, Any]:
         """Extract all available metadata from an image file"""
@@ -56,7 +74,7 @@ class MetadataExtractor:
     def _get_file_info(self, file_path: str) -> Dict[str, Any]:
         """Get basic file information"""
         stat = os.stat(file_path)
-        mime_type = magic.from_file(file_path, mime=True)
+        mime_type = self._mime_type(file_path)
         
         return {
             'size': stat.st_size,
@@ -35,9 +35,21 @@ def phash_from_path(path: str) -> Optional[str]:
         return None
 
 
+def phash_to_int(a: Optional[str]) -> Optional[int]:
+    # Parse once, then compare with hamming_distance as often as needed
+    try:
+        return int(a, 16)
+    except Exception:
+        return None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
 def hamming_distance_hex(a: str, b: str) -> int:
     try:
-        return bin(int(a, 16) ^ int(b, 16)).count('1')
+        return hamming_distance(int(a, 16), int(b, 16))
     except Exception:
         return 256  # treat as far apart
 
@@ -49,3 +61,55 @@ def prefix(a: str, bits: int = 16) -> str:
     hex_chars = (bits + 3) // 4
     return a[:hex_chars]
 
+
+
+class BKTree:
+    """BK-tree over hex phashes for nearest-neighbour lookups by Hamming distance"""
+
+    def __init__(self):
+        # Nodes are [hash_int, value, {distance: child}]
+        self._root = None
+
+    def add(self, phash_hex: str, value) -> None:
+        try:
+            h = int(phash_hex, 16)
+        except Exception:
+            return
+        if self._root is None:
+            self._root = [h, value, {}]
+            return
+        node = self._root
+        while True:
+            d = (h ^ node[0]).bit_count()
+            if d == 0:
+                node[1] = value
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, value, {}]
+                return
+            node = child
+
+    def nearest(self, phash_hex: str, max_distance: int):
+        """Value of the closest stored hash within max_distance bits, or None"""
+        if self._root is None:
+            return None
+        try:
+            h = int(phash_hex, 16)
+        except Exception:
+            return None
+        best = None
+        best_d = max_distance + 1
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = (h ^ node[0]).bit_count()
+            if d < best_d:
+                best, best_d = node[1], d
+                if d == 0:
+                    break
+            # Triangle inequality: only children with |k - d| < best_d can be closer
+            for k, child in node[2].items():
+                if abs(k - d) < best_d:
+                    stack.append(child)
+        return best
@@ -1,4 +1,5 @@
 import hashlib
+import os
 from typing import Optional
 
 
@@ -18,3 +19,33 @@ def compute_file_hash(path: str, chunk_size: int = 1024 * 1024) -> Optional[str]
     return digest.hexdigest()
   except Exception:
     return None
+
+
+# Bytes hashed from each end of the file by compute_quick_hash
+QUICK_HASH_SAMPLE_BYTES = 256 * 1024
+# Length of a compute_file_hash (SHA-256) hex digest, as stored by older blacklist rows
+FULL_HASH_LENGTH = 64
+
+
+def compute_quick_hash(path: str, sample_bytes: int = QUICK_HASH_SAMPLE_BYTES) -> Optional[str]:
+  """Return a cheap fingerprint: BLAKE2b-64 of the first and last ``sample_bytes``
+  plus the file size, as 32 hex characters.
+
+  Reads at most ``2 * sample_bytes`` regardless of file size. Good enough for
+  re-import detection, where a rare false match only skips a file; use
+  ``compute_file_hash`` where content identity matters. Returns ``None`` if the
+  file cannot be read.
+  """
+  try:
+    digest = hashlib.blake2b(digest_size=8)
+    with open(path, 'rb') as handle:
+      size = os.fstat(handle.fileno()).st_size
+      digest.update(handle.read(sample_bytes))
+      if size > 2 * sample_bytes:
+        handle.seek(-sample_bytes, os.SEEK_END)
+        digest.update(handle.read(sample_bytes))
+      elif size > sample_bytes:
+        digest.update(handle.read())
+    return f"{digest.hexdigest()}{size:016x}"
+  except Exception:
+    return None
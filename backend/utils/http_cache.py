@@ -0,0 +1,39 @@
+"""Helpers for conditional (ETag / If-None-Match) responses on polled endpoints."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Build a weak ETag from the values that determine a response body."""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def file_etag(st: os.stat_result) -> str:
+    """Build a strong ETag for a file from its inode, mtime and size."""
+    return f'"{st.st_ino:x}-{int(st.st_mtime):x}-{st.st_size:x}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match lists ``etag``."""
+    if_none_match = request.headers.get("if-none-match")
+    return bool(if_none_match) and etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Return a 304 response if the client already holds ``etag``.
+
+    Otherwise tag ``response`` with the ETag (and ask clients to revalidate)
+    and return None so the caller builds the full body.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
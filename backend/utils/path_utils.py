@@ -2,17 +2,36 @@
 
 from __future__ import annotations
 
+import functools
 import os
+import threading
+from collections import OrderedDict
 from typing import Optional, Tuple
 
+# Resolved serving paths kept in memory, keyed by (image id, local_path, path)
+SERVING_PATH_CACHE_MAX_ENTRIES = 100_000
+_serving_path_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_serving_path_lock = threading.Lock()
 
+
+@functools.lru_cache(maxsize=1)
 def _get_path_config() -> Tuple[str, str]:
-    """Return (host_path, container_path) from environment variables."""
+    """Return (host_path, container_path) from environment variables.
+
+    Read once per process; the mapping is fixed by the container's environment.
+    """
     host = (os.getenv('LIBRARY_HOST_PATH') or '').rstrip('/')
     container = (os.getenv('LIBRARY_CONTAINER_PATH') or '/library').rstrip('/') or '/library'
     return host, container
 
 
+@functools.lru_cache(maxsize=1)
+def _get_prefix_map() -> Tuple[Tuple[str, str], ...]:
+    """Return the (host_prefix, container_prefix) pairs to try, in order."""
+    host, container = _get_path_config()
+    return ((host, container),) if host else ()
+
+
 def get_container_path(original_path: Optional[str]) -> Optional[str]:
     """Map a host path to the mounted container path if configured.
 
@@ -25,9 +44,9 @@ def get_container_path(original_path: Optional[str]) -> Optional[str]:
     if not original_path:
         return original_path
 
-    host, container = _get_path_config()
-    if host and original_path.startswith(host):
-        return original_path.replace(host, container, 1)
+    for prefix, replacement in _get_prefix_map():
+        if original_path.startswith(prefix):
+            return replacement + original_path[len(prefix):]
     return original_path
 
 
@@ -41,3 +60,62 @@ def get_container_root() -> str:
     """Return the configured container mount point for the library."""
     _, container = _get_path_config()
     return container or '/library'
+
+
+def _find_serving_path(local_path: Optional[str], path: Optional[str]) -> Optional[str]:
+    """Stat the candidate locations in order: local copy, stored path, mapped path."""
+    if local_path and os.path.exists(local_path):
+        return local_path
+    if not path:
+        return None
+    if os.path.exists(path):
+        return path
+    mapped = get_container_path(path)
+    if mapped and mapped != path and os.path.exists(mapped):
+        return mapped
+    return None
+
+
+def resolve_serving_path(image_id: int, local_path: Optional[str], path: Optional[str]) -> Optional[str]:
+    """Return the path to serve an image from (prefer local copy, fallback to original).
+
+    Found paths are remembered in an LRU keyed on the image's stored paths, so
+    repeat requests skip the stat calls. Misses are not cached, so a file that
+    appears later (e.g. a new media copy) is picked up on the next request. A
+    cached path can go stale; callers that fail to open it should call
+    invalidate_serving_path and resolve again.
+
+    Args:
+        image_id: Database id of the image.
+        local_path: Stored local media copy path, if any.
+        path: Stored original path (host or container path).
+
+    Returns:
+        An existing path for the image, or None if none of the candidates exist.
+    """
+    key = (image_id, local_path, path)
+    with _serving_path_lock:
+        cached = _serving_path_cache.get(key)
+        if cached is not None:
+            _serving_path_cache.move_to_end(key)
+            return cached
+
+    resolved = _find_serving_path(local_path, path)
+    if resolved:
+        with _serving_path_lock:
+            _serving_path_cache[key] = resolved
+            if len(_serving_path_cache) > SERVING_PATH_CACHE_MAX_ENTRIES:
+                _serving_path_cache.popitem(last=False)
+    return resolved
+
+
+def invalidate_serving_path(image_id: int, local_path: Optional[str], path: Optional[str]) -> None:
+    """Forget the cached serving path for one image, e.g. after it failed to stat."""
+    with _serving_path_lock:
+        _serving_path_cache.pop((image_id, local_path, path), None)
+
+
+def clear_serving_path_cache() -> None:
+    """Forget resolved serving paths (after a scan may have moved or removed files)."""
+    with _serving_path_lock:
+        _serving_path_cache.clear()
@@ -0,0 +1,38 @@
+"""Short-lived caching for polled endpoints whose results may lag by a few seconds."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+def async_ttl_cache(ttl: float):
+    """Cache an async function's result per positional-argument tuple for ``ttl`` seconds.
+
+    Callers arriving while a key is being recomputed wait on the same
+    computation (single flight), so a burst of requests runs it once.
+    The wrapped function gets a ``cache_clear()`` helper.
+    """
+    def decorator(fn: Callable[..., Awaitable[Any]]):
+        entries: Dict[Tuple, Tuple[float, Any]] = {}
+        locks: Dict[Tuple, asyncio.Lock] = {}
+
+        @functools.wraps(fn)
+        async def wrapper(*args):
+            entry = entries.get(args)
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            lock = locks.setdefault(args, asyncio.Lock())
+            async with lock:
+                entry = entries.get(args)
+                if entry and entry[0] > time.monotonic():
+                    return entry[1]
+                value = await fn(*args)
+                entries[args] = (time.monotonic() + ttl, value)
+                return value
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+    return decorator
@@ -0,0 +1,37 @@
+"""Celery application for long-running library jobs.
+
+Jobs go through Celery only when CELERY_BROKER_URL is set (e.g. redis://redis:6379/0).
+Without a broker the API falls back to running them in-process via BackgroundTasks.
+
+Run a worker with:
+    celery -A backend.workers.celery_app:celery_app worker --concurrency=1
+"""
+
+import os
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "")
+
+celery_app = None
+if CELERY_BROKER_URL:
+    from celery import Celery
+
+    celery_app = Celery(
+        "photo_library",
+        broker=CELERY_BROKER_URL,
+        include=["backend.workers.jobs", "backend.workers.tagging"],
+    )
+    celery_app.conf.update(
+        # Job state lives in the jobs table, so task results are not stored
+        task_ignore_result=True,
+        # Jobs are long; hand them out one at a time and re-deliver if a worker dies
+        task_acks_late=True,
+        worker_prefetch_multiplier=1,
+    )
+
+
+def enqueue(background_tasks, task_name: str, func, *args):
+    """Send a job to the Celery queue, or run it in-process when no broker is configured"""
+    if celery_app is not None:
+        celery_app.send_task(task_name, args=list(args))
+    else:
+        background_tasks.add_task(func, *args)
@@ -0,0 +1,186 @@
+"""Long-running job bodies (indexing, thumbnails, refresh-exif).
+
+Each function opens its own session, so it can run either as a Celery task in a
+separate worker process or in-process through FastAPI BackgroundTasks.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import update
+
+from backend.models import SessionLocal, Job, Image
+from backend.services.metadata_extractor import MetadataExtractor
+from backend.workers.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+# Images handled per refresh-exif batch (one SELECT + one bulk UPDATE + one commit)
+REFRESH_EXIF_BATCH_SIZE = 500
+# Processes extracting metadata in parallel during refresh-exif (1 = in the job thread)
+REFRESH_EXIF_WORKERS = int(os.getenv("REFRESH_EXIF_WORKERS", str(os.cpu_count() or 1)))
+
+_EXIF_IMAGE_FIELDS = ('width', 'height', 'aspect_ratio', 'format')
+_EXIF_NORMALIZED_FIELDS = (
+    'camera_make', 'camera_model', 'lens_model', 'focal_length',
+    'aperture', 'shutter_speed', 'iso', 'date_taken',
+)
+
+def _exif_update_mapping(image_id: int, md: dict) -> dict:
+    """Build a bulk_update_mappings entry from extracted metadata.
+    Only fields with a usable value are included, so existing values are kept otherwise.
+    """
+    image_info = md.get('image_info', {})
+    normalized = md.get('normalized', {})
+    mapping = {"id": image_id}
+    file_size = md.get('file_info', {}).get('size')
+    if file_size is not None:
+        mapping['file_size'] = file_size
+    for field in _EXIF_IMAGE_FIELDS:
+        if image_info.get(field):
+            mapping[field] = image_info[field]
+    for field in _EXIF_NORMALIZED_FIELDS:
+        if normalized.get(field):
+            mapping[field] = normalized[field]
+    if normalized.get('flash_used') is not None:
+        mapping['flash_used'] = normalized['flash_used']
+    return mapping
+
+# Extractor owned by the current (pool) process, reused for every path it handles
+_process_extractor = None
+
+def _extract_exif_mapping(item, extractor: Optional[MetadataExtractor] = None):
+    """Extract metadata for one (image_id, path) pair with the given extractor,
+    or in a pool process with that process's own
+    """
+    global _process_extractor
+    image_id, path = item
+    try:
+        if not path or not os.path.exists(path):
+            return None
+        if extractor is None:
+            if _process_extractor is None:
+                _process_extractor = MetadataExtractor()
+            extractor = _process_extractor
+        return _exif_update_mapping(image_id, extractor.extract_metadata(path))
+    except Exception:
+        return None
+
+def _exif_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool for metadata extraction, or None to extract in the job thread.
+    Daemonic processes (Celery prefork children) can't start children of their own.
+    """
+    if REFRESH_EXIF_WORKERS <= 1 or multiprocessing.current_process().daemon:
+        return None
+    try:
+        return ProcessPoolExecutor(max_workers=REFRESH_EXIF_WORKERS)
+    except Exception as e:
+        logger.warning(f"Could not start the refresh-exif process pool ({e}); extracting in-process")
+        return None
+
+def _update_job(session, job_id: int, **values):
+    """Write job fields with a plain UPDATE and commit, without tracking a Job object"""
+    session.execute(update(Job).where(Job.id == job_id).values(**values))
+    session.commit()
+
+def run_indexing(job_id: int):
+    """Scan the library for new/changed files"""
+    from backend.services.image_scanner import ImageScanner
+    session = SessionLocal()
+    try:
+        ImageScanner().scan_library(session, job_id)
+    finally:
+        session.close()
+
+def run_thumbnails(job_id: int, force_regen: bool, size: Optional[int] = None):
+    """Generate thumbnails for the library"""
+    from backend.services.thumbnail_generator import ThumbnailGenerator
+    session = SessionLocal()
+    try:
+        ThumbnailGenerator(thumbnail_size=size).generate_thumbnails(session, job_id, force_regen)
+    finally:
+        session.close()
+
+def run_refresh_exif(job_id: int, only_missing: bool):
+    """Re-extract EXIF/metadata for all images, or only those missing it"""
+    session = SessionLocal()
+    try:
+        if session.query(Job.id).filter(Job.id == job_id).scalar() is None:
+            return
+        _update_job(session, job_id, status='running', started_at=datetime.now())
+
+        # Only (id, path) is needed to extract; rows are walked in id-ordered
+        # pages so memory stays flat and commits between pages are safe.
+        q = session.query(Image.id, Image.path)
+        if only_missing:
+            q = q.filter(
+                (Image.camera_make.is_(None)) &
+                (Image.camera_model.is_(None)) &
+                (Image.date_taken.is_(None))
+            )
+        total = q.count()
+        _update_job(session, job_id, total_items=total, processed_items=0, progress=0)
+
+        # Extraction is data-parallel, so it runs in a process pool when one can be
+        # started; DB writes stay on this thread with the one session
+        processed = 0
+        last_id = 0
+        ex = _exif_pool()
+        # In-process extraction uses one extractor (one libmagic handle) for the
+        # whole job; pool processes keep their own
+        with MetadataExtractor() if ex is None else nullcontext() as extractor:
+            try:
+                while True:
+                    batch = q.filter(Image.id > last_id).order_by(Image.id).limit(REFRESH_EXIF_BATCH_SIZE).all()
+                    if not batch:
+                        break
+                    last_id = batch[-1].id
+
+                    items = [(image_id, path) for image_id, path in batch]
+                    if ex:
+                        results = ex.map(_extract_exif_mapping, items, chunksize=32)
+                    else:
+                        results = (_extract_exif_mapping(item, extractor) for item in items)
+                    mappings = [m for m in results if m]
+                    processed += len(items)
+
+                    if mappings:
+                        session.bulk_update_mappings(Image, mappings)
+                    # Progress is written once per page and committed together with the page
+                    _update_job(
+                        session, job_id,
+                        processed_items=processed,
+                        progress=int(processed * 100 / total) if total else 0,
+                    )
+            finally:
+                if ex:
+                    ex.shutdown()
+
+        _update_job(
+            session, job_id,
+            processed_items=processed,
+            progress=100,
+            status='completed',
+            completed_at=datetime.now(),
+        )
+    except Exception as e:
+        logger.error(f"Refresh EXIF job {job_id} failed: {e}")
+        session.rollback()
+        _update_job(
+            session, job_id,
+            status='failed',
+            error_message=str(e),
+            completed_at=datetime.now(),
+        )
+    finally:
+        session.close()
+
+if celery_app is not None:
+    celery_app.task(name="indexing.run")(run_indexing)
+    celery_app.task(name="thumbnails.run")(run_thumbnails)
+    celery_app.task(name="refresh_exif.run")(run_refresh_exif)
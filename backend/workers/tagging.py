@@ -0,0 +1,270 @@
+"""
+Batch AI tagging job.
+Runs as a Celery task in the worker (or in-process via BackgroundTasks when no
+broker is configured), with its own session and a warm tagger instance.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from backend.models import SessionLocal, Job, Tag, Image
+from backend.models.image import image_tags
+from backend.services.ai_tagger import get_ai_tagger
+from backend.services.ai_tag_cache import generate_tags_cached_batch
+from backend.workers.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+# Minimum time between job progress writes while tagging
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+AI_TAG_COLOR = "#10B981"  # Green color for AI tags
+
+def _upsert_insert(db: Session):
+    """Dialect insert() supporting ON CONFLICT DO NOTHING, or None if unavailable"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as upsert
+        return upsert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as upsert
+        return upsert
+    return None
+
+def normalize_tag_names(tag_names: List[str]) -> List[str]:
+    """Lowercase and strip suggested tag names, dropping blanks and duplicates (order kept)"""
+    return list(dict.fromkeys(
+        name.strip().lower() for name in tag_names if name and name.strip()
+    ))
+
+def ensure_tags(db: Session, tag_cache: Dict[str, Tag], tag_names: List[str]) -> None:
+    """Make sure every name in tag_names has a Tag in the name->Tag dict.
+    Missing names are inserted with ON CONFLICT DO NOTHING, so concurrent taggers
+    creating the same tag don't fail, and then loaded with a single SELECT.
+    """
+    missing = [name for name in dict.fromkeys(tag_names) if name not in tag_cache]
+    if not missing:
+        return
+    
+    upsert = _upsert_insert(db)
+    
+    if upsert is not None:
+        db.execute(
+            upsert(Tag)
+            .values([{"name": name, "color": AI_TAG_COLOR} for name in missing])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+    else:
+        for name in missing:
+            db.add(Tag(name=name, color=AI_TAG_COLOR))
+        db.flush()
+    
+    for tag in db.query(Tag).filter(Tag.name.in_(missing)).all():
+        tag_cache[tag.name] = tag
+
+def insert_image_tags(db: Session, pairs) -> int:
+    """Insert (image_id, tag_id) associations, skipping ones that already exist.
+    Returns the number of associations added.
+    """
+    rows = [{"image_id": image_id, "tag_id": tag_id} for image_id, tag_id in pairs]
+    if not rows:
+        return 0
+    
+    upsert = _upsert_insert(db)
+    
+    if upsert is not None:
+        result = db.execute(upsert(image_tags).values(rows).on_conflict_do_nothing())
+        return result.rowcount
+    
+    existing = set(
+        db.query(image_tags.c.image_id, image_tags.c.tag_id).filter(
+            image_tags.c.image_id.in_({r["image_id"] for r in rows})
+        ).all()
+    )
+    rows = [r for r in rows if (r["image_id"], r["tag_id"]) not in existing]
+    if rows:
+        db.execute(insert(image_tags), rows)
+    return len(rows)
+
+def _async_commit(session, transaction, connection):
+    """after_begin hook: let this transaction's COMMIT return before the WAL flush.
+    A crash can lose the last few chunks, which the job simply re-tags on a rerun.
+    SET LOCAL ends with the transaction, so pooled connections are unaffected.
+    """
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("SET LOCAL synchronous_commit = OFF")
+
+def _iter_image_id_chunks(db: Session, image_ids: Optional[List[int]], chunk_size: int):
+    """Yield the ids to tag in chunks: slices of an explicit list, or (for None)
+    the currently untagged images paged by id, so the full set is never loaded.
+    """
+    if image_ids is not None:
+        for start in range(0, len(image_ids), chunk_size):
+            yield image_ids[start:start + chunk_size]
+        return
+    last_id = 0
+    while True:
+        chunk = [
+            image_id for (image_id,) in db.query(Image.id)
+            .filter(~Image.tags.any(), Image.id > last_id)
+            .order_by(Image.id)
+            .limit(chunk_size)
+            .all()
+        ]
+        if not chunk:
+            return
+        last_id = chunk[-1]
+        yield chunk
+
+def run_ai_tagging(job_id: int):
+    """Run an ai_tagging job over the image ids stored in its parameters"""
+    # Our own database session for this task; cached Tag and Job objects stay
+    # loaded across the chunk commits
+    db = SessionLocal()
+    # Per-chunk commits don't wait on fsync (PostgreSQL)
+    event.listen(db, "after_begin", _async_commit)
+    
+    try:
+        job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            logger.warning(f"AI tagging job {job_id} not found")
+            return
+        # Either an explicit id list, or None to tag every untagged image
+        image_ids = (job.parameters or {}).get("image_ids")
+        total_images = len(image_ids) if image_ids is not None else (job.total_items or 0)
+        logger.info(f"Starting batch AI tagging for {total_images} images (job {job_id})")
+        
+        # Update job status to running
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        db.commit()
+        
+        # All tags are loaded once; new ones are added to the dict as they are created
+        tag_cache = {t.name: t for t in db.query(Tag).all()}
+        
+        # The tagger is a per-process singleton; initialize() only loads the
+        # model the first time a process needs it
+        ai_tagger = get_ai_tagger()
+        if not ai_tagger.initialize():
+            raise Exception("Failed to initialize AI tagger")
+        
+        processed = 0
+        handled = 0
+        total_tags_applied = 0
+        last_progress_ts = time.monotonic()
+        
+        # Tag associations and progress are committed once per chunk of images;
+        # each chunk's uncached images go through the model as one batch
+        commit_every = 20
+        
+        for chunk_ids in _iter_image_id_chunks(db, image_ids, commit_every):
+            handled += len(chunk_ids)
+            # Only id, path and phash are needed; associations are written directly
+            rows_by_id = {
+                image_id: (path, phash) for image_id, path, phash in
+                db.query(Image.id, Image.path, Image.phash).filter(Image.id.in_(chunk_ids)).all()
+            }
+            chunk_images = []
+            for image_id in chunk_ids:
+                if image_id not in rows_by_id:
+                    logger.warning(f"Image {image_id} not found, skipping")
+                    continue
+                chunk_images.append(image_id)
+            
+            # Per-image problems already fall back inside the tagger; anything
+            # raised here is a broken tagger and fails the job instead of
+            # recording empty tags
+            chunk_tags = generate_tags_cached_batch(
+                db, ai_tagger,
+                [rows_by_id[i][0] for i in chunk_images],
+                phashes=[rows_by_id[i][1] for i in chunk_images],
+            )
+            chunk_tags = [normalize_tag_names(names) for names in chunk_tags]
+            
+            try:
+                # Create every new tag the chunk needs in one statement
+                ensure_tags(db, tag_cache, [name for names in chunk_tags for name in names])
+                
+                # Associate all of the chunk's tags in one INSERT; pairs that already
+                # exist are skipped by the database
+                pairs = {
+                    (image_id, tag_cache[tag_name].id)
+                    for image_id, suggested_tags in zip(chunk_images, chunk_tags)
+                    for tag_name in suggested_tags
+                }
+                chunk_tags_applied = insert_image_tags(db, pairs)
+                
+                processed += len(chunk_images)
+                total_tags_applied += chunk_tags_applied
+                # The job row is only rewritten every few seconds; otherwise the
+                # chunk commit carries just the tag writes
+                now = time.monotonic()
+                if job and now - last_progress_ts >= PROGRESS_INTERVAL_SECONDS:
+                    job.processed_items = processed
+                    job.progress = min(100, int((handled / total_images) * 100)) if total_images else 0
+                    last_progress_ts = now
+                    logger.info(f"Progress: {handled}/{total_images}")
+                db.commit()
+            
+            except Exception as e:
+                logger.error(f"Failed to process images {chunk_ids[0]}..{chunk_ids[-1]}: {e}")
+                db.rollback()
+                # Tags flushed inside the rolled-back chunk no longer exist
+                tag_cache = {t.name: t for t in db.query(Tag).all()}
+                continue
+        
+        # Mark job as completed
+        if job:
+            job.status = "completed"
+            job.completed_at = datetime.utcnow()
+            job.progress = 100
+            job.processed_items = processed
+            job.result = {
+                "processed_images": processed,
+                "total_tags_applied": total_tags_applied
+            }
+            db.commit()
+        
+        logger.info(f"Batch AI tagging completed: {processed} images processed, {total_tags_applied} tags applied")
+        
+    except Exception as e:
+        logger.error(f"Batch AI tagging failed: {e}")
+        
+        # Mark job as failed
+        try:
+            db.rollback()
+            if job:
+                job.status = "failed"
+                job.error_message = str(e)
+                job.completed_at = datetime.utcnow()
+                db.commit()
+        except:
+            pass
+            
+    finally:
+        # The tagger is left loaded for later requests and jobs; always close
+        # the database session
+        db.close()
+
+if celery_app is not None:
+    from celery.signals import worker_process_init
+
+    celery_app.task(name="ai_tagging.run")(run_ai_tagging)
+
+    @worker_process_init.connect
+    def _preload_worker_tagger(**kwargs):
+        """Load the model when a worker process starts rather than in its first job.
+        Runs in a thread: worker_process_init must return quickly, and the
+        tagger's init lock makes a job that starts meanwhile wait for the load.
+        """
+        if os.getenv("AI_TAGGER_PRELOAD", "true").lower() != "true":
+            return
+        import threading
+        from backend.services.ai_tagger import preload_ai_tagger
+        threading.Thread(target=preload_ai_tagger, name="ai-tagger-preload", daemon=True).start()